@@ -1,5 +1,4 @@
 import streamlit as st
-import json
 import os
 
 # Set page config
@@ -9,18 +8,18 @@ st.set_page_config(
     layout="wide"
 )
 
-# Load Database
-def load_data():
-    if os.path.exists("database.json"):
-        with open("database.json", "r") as f:
-            return json.load(f)
-    return {"calibers": {}}
+# Load Database (shared across sessions, reloaded only when database.json changes)
+from catalog import get_catalog, UserCatalog, parse_projectile_weight
+from load_model import get_powder_models, estimate_charges
 
-db = load_data()
+catalog = get_catalog() # also registers the catalog's brand-less powder aliases
 
 # Ensure Database Initialization and Default User
-from models import User, Firearm, ReloadSession, InventoryItem, get_session
-import bcrypt
+from models import User, Firearm, ReloadSession, InventoryItem, CustomLoad, UserStats, get_session
+from data_context import DataContext
+from passwords import needs_rehash
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 
 def init_db_if_empty():
     session = get_session()
@@ -49,10 +48,20 @@ def init_db_if_empty():
 
 init_db_if_empty()
 from datetime import datetime
-from label_gen import create_label_pdf
-from report_gen import create_inspection_report
+from label_gen import get_label_pdf, create_labels_pdf, create_label_sheet_pdf, LABEL_SHEETS
+from ladder import charge_ladder, create_ladder_sessions
+from queries import sessions_page, session_calibers, inventory_page, cost_summary
+from inventory_service import (
+    consume_for_session, consume_for_sessions, backfill_session_costs,
+    receive_stock, remove_stock_item,
+)
+from stock_ledger import stock_at
+from planner import get_build_capacity
+from forecast import reorder_alerts
+from units import DISPLAY_UNITS, from_base, factor as unit_factor
+from report_gen import get_inspection_report, create_full_history_report
 from cv_utils import calculate_group_size
-from bio_auth import save_biometrics, check_biometrics_available, clear_biometrics
+from bio_auth import save_biometrics, clear_biometrics, saved_biometric_users, is_biometrics_enabled
 import requests
 import re
 
@@ -76,45 +85,53 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def show_ad():
+def show_ad(user):
     """Exibe um placeholder de anúncio se o usuário não for Premium."""
-    if "user_id" in st.session_state and st.session_state["user_id"]:
-        session = get_session()
-        user = session.query(User).get(st.session_state["user_id"])
-        
-        if user and not user.is_premium:
-            st.markdown("---")
-            st.caption("Publicidade")
-            # AdSense style placeholder (In a real app, this would be your ad script or native ad view)
-            st.info("📢 **Espaço para Google Ads**\n\nTorne-se **Premium** para remover os anúncios e apoiar o desenvolvimento!")
-            st.markdown("---")
-        session.close()
+    if user and not user.is_premium:
+        st.markdown("---")
+        st.caption("Publicidade")
+        # AdSense style placeholder (In a real app, this would be your ad script or native ad view)
+        st.info("📢 **Espaço para Google Ads**\n\nTorne-se **Premium** para remover os anúncios e apoiar o desenvolvimento!")
+        st.markdown("---")
 
 # User Authentication Logic
 def authenticate(username, password):
     session = get_session()
-    user = session.query(User).filter_by(username=username).first()
-    if user and user.check_password(password):
-        session.close()
+    try:
+        user = session.query(User).filter_by(username=username).first()
+        if user is None or not user.check_password(password):
+            return None
+        # Hash made with another cost (BCRYPT_ROUNDS changed): upgrade it while we have the password
+        if needs_rehash(user.password_hash):
+            user.set_password(password)
+            session.commit()
+            session.refresh(user)
         return user
-    session.close()
-    return None
+    finally:
+        session.close()
 
 def register_user(username, password, name, cpf, email, phone):
     session = get_session()
-    if session.query(User).filter_by(username=username).first():
-        session.close()
-        return False, "Usuário já existe."
-    if email and session.query(User).filter_by(email=email).first():
+    try:
+        # Username and e-mail checked in one query; the hash is computed only for new accounts
+        clauses = [User.username == username] + ([User.email == email] if email else [])
+        taken = session.query(User.username).filter(or_(*clauses)).all()
+        if any(u == username for (u,) in taken):
+            return False, "Usuário já existe."
+        if taken:
+            return False, "E-mail já cadastrado."
+
+        new_user = User(username=username, name=name, cpf=cpf, email=email, phone=phone)
+        new_user.set_password(password)
+        session.add(new_user)
+        try:
+            session.commit()
+        except IntegrityError: # same username registered concurrently
+            session.rollback()
+            return False, "Usuário já existe."
+        return True, "Usuário registrado com sucesso!"
+    finally:
         session.close()
-        return False, "E-mail já cadastrado."
-    
-    new_user = User(username=username, name=name, cpf=cpf, email=email, phone=phone)
-    new_user.set_password(password)
-    session.add(new_user)
-    session.commit()
-    session.close()
-    return True, "Usuário registrado com sucesso!"
 
 def recover_password(identifier):
     session = get_session()
@@ -393,9 +410,13 @@ else:
 
 if not st.session_state["authenticated"]:
     # Bio check
-    bio_user = check_biometrics_available()
+    bio_users = () if st.session_state.get("bio_skip") else saved_biometric_users()
     
-    if bio_user:
+    if bio_users:
+        if len(bio_users) > 1:
+            bio_user = st.selectbox("Conta", bio_users, key="bio_user")
+        else:
+            bio_user = bio_users[0]
         st.info(f"Bem-vindo de volta, **{bio_user}**!")
         col_bio1, col_bio2 = st.columns([1, 1])
         if col_bio1.button("🔓 Entrar com Biometria", type="primary", use_container_width=True):
@@ -411,7 +432,7 @@ if not st.session_state["authenticated"]:
             session.close()
             
         if col_bio2.button("Usar Outra Conta", use_container_width=True):
-            clear_biometrics()
+            st.session_state["bio_skip"] = True
             st.rerun()
             
     else:
@@ -482,10 +503,11 @@ if not st.session_state["authenticated"]:
 
 # Logout in sidebar
 if st.sidebar.button("Sair / Logout"):
+    clear_biometrics(st.session_state["username"]) # Clear this user's biometrics on explicit logout
     st.session_state["authenticated"] = False
     st.session_state["user_id"] = None
     st.session_state["username"] = None
-    clear_biometrics() # Clear biometrics on explicit logout
+    st.session_state["bio_skip"] = False
     st.rerun()
 
 with st.expander("🛡️ Protocolo de Segurança e Termos"):
@@ -494,20 +516,34 @@ with st.expander("🛡️ Protocolo de Segurança e Termos"):
     Este software é uma ferramenta de apoio. Sempre valide os dados com manuais físicos e inicie com cargas mínimas.
     """)
 
-# --- Financial & Inventory Dashboard ---
-session = get_session()
-user_inv = session.query(InventoryItem).filter_by(user_id=st.session_state["user_id"]).all()
-total_investment = sum(item.quantity * item.price_unit for item in user_inv)
-categories_count = {}
-for item in user_inv:
-    categories_count[item.category] = categories_count.get(item.category, 0) + 1
-session.close()
-
-db_col1, db_col2, db_col3, db_col4 = st.columns(4)
-db_col1.metric("Investimento Total", f"R$ {total_investment:.2f}")
-db_col2.metric("Itens em Estoque", len(user_inv))
-db_col3.metric("Pólvoras", categories_count.get("Pólvora", 0))
-db_col4.metric("Projéteis/Espoletas", categories_count.get("Projétil", 0) + categories_count.get("Espoleta", 0))
+# --- Per-run data context: one DB session and one User for every tab ---
+# The previous run's context is closed here, since st.rerun()/st.stop() can
+# end a run before its last line.
+if st.session_state.get("_data_ctx") is not None:
+    st.session_state["_data_ctx"].close()
+ctx = DataContext(st.session_state["user_id"])
+st.session_state["_data_ctx"] = ctx
+session = ctx.session
+
+# --- Financial & Inventory Dashboard (one pre-aggregated row) ---
+stats = session.get(UserStats, ctx.user_id) or UserStats(
+    total_investment=0.0, item_count=0, powder_items=0, projectile_items=0, primer_items=0, total_rounds=0
+)
+
+db_col1, db_col2, db_col3, db_col4, db_col5 = st.columns(5)
+db_col1.metric("Investimento Total", f"R$ {stats.total_investment:.2f}")
+db_col2.metric("Itens em Estoque", stats.item_count)
+db_col3.metric("Pólvoras", stats.powder_items)
+db_col4.metric("Projéteis/Espoletas", stats.projectile_items + stats.primer_items)
+db_col5.metric("Munições Recarregadas", stats.total_rounds)
+
+# Reorder alerts: current consumption rate (incrementally kept daily usage) vs stock
+for f in reorder_alerts(session, ctx.user_id):
+    st.warning(
+        f"⚠️ **{f.name}** acaba em ~{f.days_left:.0f} dias ({f.runs_out.strftime('%d/%m/%Y')}): "
+        f"restam {from_base(f.quantity, f.display_unit):.1f} {f.display_unit}, "
+        f"consumo de {from_base(f.daily_rate * 30, f.display_unit):.1f} {f.display_unit}/mês."
+    )
 
 st.divider()
 
@@ -517,36 +553,66 @@ st.sidebar.header("Configuração de Carga")
 # Initialize manual variables
 manual_caliber, manual_projectile, manual_powder = "N/A", "N/A", "N/A"
 
+# User's custom loads layered over the shared catalog (the base is never copied)
+user_custom_loads = {
+    (c.caliber, c.projectile, c.powder): c.as_load()
+    for c in ctx.load("custom_loads").custom_loads
+}
+user_catalog = UserCatalog(catalog, user_custom_loads)
+
+# Search Mode (reverse indexes: powder / projectile weight / velocity)
+if st.sidebar.radio("Modo de Seleção", ["Navegar", "Buscar"], horizontal=True) == "Buscar":
+    with st.sidebar.expander("🔎 Buscar no Catálogo", expanded=True):
+        q_powder = st.selectbox("Pólvora", ["Todas"] + list(user_catalog.powder_names), key="q_powder")
+        q_weight = st.selectbox("Peso do Projétil", ["Todos"] + list(user_catalog.projectile_weights), format_func=lambda w: w if w == "Todos" else f"{w:g}gr", key="q_weight")
+        q_v1, q_v2 = st.columns(2)
+        q_vmin = q_v1.number_input("Vel. Mín (fps)", min_value=0, step=50, key="q_vmin")
+        q_vmax = q_v2.number_input("Vel. Máx (fps)", min_value=0, step=50, key="q_vmax")
+
+        search_results = user_catalog.query(
+            powder=None if q_powder == "Todas" else q_powder,
+            weight=None if q_weight == "Todos" else q_weight,
+            min_velocity=q_vmin or None,
+            max_velocity=q_vmax or None,
+        )
+        st.caption(f"{len(search_results)} carga(s) encontrada(s)")
+        if search_results:
+            picked = st.selectbox(
+                "Resultados", search_results,
+                format_func=lambda e: f"{e.caliber} | {e.projectile} | {e.powder} | {e.velocity or '-'} fps",
+                key="q_result"
+            )
+            if st.button("Usar esta carga", use_container_width=True):
+                st.session_state["sel_caliber"] = picked.caliber
+                st.session_state["sel_projectile"] = picked.projectile
+                st.session_state["sel_powder"] = picked.powder
+                st.rerun()
+
+def _sidebar_select(label, options, key):
+    # Drop a stale selection (e.g. projectile from another caliber) before rendering
+    if st.session_state.get(key) not in options:
+        st.session_state.pop(key, None)
+    return st.sidebar.selectbox(label, options, key=key)
+
+# Selection requested after the sidebar widgets were rendered (e.g. a custom load just saved)
+pending_selection = st.session_state.pop("pending_selection", None)
+if pending_selection:
+    st.session_state["sel_caliber"], st.session_state["sel_projectile"], st.session_state["sel_powder"] = pending_selection
+
 # 1. Caliber Selection
-calibers = list(db["calibers"].keys())
-calibers.sort()
-calibers.append("Outro")
-selected_caliber = st.sidebar.selectbox("Selecione o Calibre", calibers)
+calibers = list(user_catalog.calibers) + ["Outro"]
+selected_caliber = _sidebar_select("Selecione o Calibre", calibers, "sel_caliber")
 
 # 2. Projectile Selection
-projectiles = []
-if selected_caliber != "Outro" and selected_caliber in db["calibers"]:
-    projectiles = list(db["calibers"][selected_caliber]["projectiles"].keys())
-    projectiles.sort()
-projectiles.append("Outro")
-selected_projectile = st.sidebar.selectbox("Selecione o Projétil", projectiles)
+projectiles = list(user_catalog.projectiles(selected_caliber)) + ["Outro"]
+selected_projectile = _sidebar_select("Selecione o Projétil", projectiles, "sel_projectile")
 
 # 3. Powder Selection (Filtered by Projectile)
-available_powders = set()
-if selected_caliber != "Outro" and selected_projectile != "Outro":
-    try:
-        proj_data = db["calibers"][selected_caliber]["projectiles"][selected_projectile]
-        available_powders.update(proj_data["powders"].keys())
-    except KeyError:
-        pass
-
-powders_list = list(available_powders)
-powders_list.sort()
-powders_list.append("Outro")
-selected_powder = st.sidebar.selectbox("Selecione a Pólvora", powders_list)
+powders_list = list(user_catalog.powders(selected_caliber, selected_projectile)) + ["Outro"]
+selected_powder = _sidebar_select("Selecione a Pólvora", powders_list, "sel_powder")
 
 # Display Powder Info (if available)
-powder_meta = db.get("powders_metadata", {}).get(selected_powder)
+powder_meta = user_catalog.powder_info(selected_powder)
 if powder_meta:
     with st.sidebar.expander("ℹ️ Detalhes da Pólvora", expanded=True):
         st.markdown(f"**Formato:** {powder_meta.get('format', 'N/A')}")
@@ -555,20 +621,15 @@ if powder_meta:
 
 # Logic for Mode
 # Check if the specific combination exists in DB
-is_manual_mode = True
-if selected_caliber != "Outro" and selected_projectile != "Outro" and selected_powder != "Outro":
-    try:
-        if selected_powder in db["calibers"][selected_caliber]["projectiles"][selected_projectile]["powders"]:
-            is_manual_mode = False
-    except KeyError:
-        pass # Stays manual mode
+selected_load = user_catalog.get_load(selected_caliber, selected_projectile, selected_powder)
+is_manual_mode = selected_load is None
 
 # Main Content Area
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Dados de Recarga", "🧪 Calculadora Preditiva", "📔 Logbook & Insumos", "📈 Análise de Performance", "👤 Meu Perfil"])
 
 with tab1:
     # Display Dimensions (Always if available)
-    caliber_data = db["calibers"].get(selected_caliber, {})
+    caliber_data = user_catalog.caliber_info(selected_caliber)
     max_oal = caliber_data.get("max_oal", "N/A")
     max_case = caliber_data.get("max_case", "N/A")
     proj_dia = caliber_data.get("proj_dia", "N/A")
@@ -606,18 +667,98 @@ with tab1:
             final_min = st.number_input("Carga Mín (grains)", value=st.session_state["manual_min"], key="min_in")
             final_max = st.number_input("Carga Máx (grains)", value=st.session_state["manual_max"], key="max_in")
             st.session_state["manual_min"], st.session_state["manual_max"] = final_min, final_max
+            manual_velocity = st.number_input("Velocidade (fps, opcional)", min_value=0.0, step=10.0, key="man_vel")
+
+        # Persist the manual load as a per-user custom load
+        c_cal = selected_caliber if selected_caliber != "Outro" else manual_caliber
+        c_proj = selected_projectile if selected_projectile != "Outro" else manual_projectile
+        c_pow = selected_powder if selected_powder != "Outro" else manual_powder
+        if st.button("💾 Salvar como Carga Personalizada", use_container_width=True):
+            if not (c_cal and c_proj and c_pow) or "N/A" in (c_cal, c_proj, c_pow):
+                st.error("Informe calibre, projétil e pólvora.")
+            elif not 0 < final_min <= final_max:
+                st.error("Informe cargas mínima e máxima válidas.")
+            else:
+                custom = session.query(CustomLoad).filter_by(
+                    user_id=st.session_state["user_id"], caliber=c_cal, projectile=c_proj, powder=c_pow
+                ).first()
+                if not custom:
+                    custom = CustomLoad(user_id=st.session_state["user_id"], caliber=c_cal, projectile=c_proj, powder=c_pow)
+                    session.add(custom)
+                custom.min, custom.max, custom.unit = final_min, final_max, "grains"
+                custom.velocity = manual_velocity or None
+                custom.note = "Carga personalizada"
+                session.commit()
+                # The sidebar selectboxes already exist in this run; applied before they render on the next one
+                st.session_state["pending_selection"] = (c_cal, c_proj, c_pow)
+                st.toast("Carga personalizada salva!", icon="💾")
+                st.rerun()
+    elif user_catalog.is_custom(selected_caliber, selected_projectile, selected_powder):
+        st.warning("🧾 **CARGA PERSONALIZADA**: Dados informados por você, não verificados pelo fabricante.")
+        final_min, final_max = selected_load.get("min", 0.0), selected_load.get("max", 0.0)
+        final_unit = selected_load.get("unit", "grains")
+
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Carga Mínima", f"{final_min} {final_unit}")
+        m2.metric("Carga Máxima", f"{final_max} {final_unit}")
+        m3.metric("Velocidade", f"{selected_load.get('velocity', 'N/A')} fps")
+        if st.button("🗑️ Excluir Carga Personalizada", use_container_width=True):
+            session.query(CustomLoad).filter_by(
+                user_id=st.session_state["user_id"], caliber=selected_caliber,
+                projectile=selected_projectile, powder=selected_powder
+            ).delete()
+            session.commit()
+            st.rerun()
     else:
         st.success("✅ **DADOS VERIFICADOS**: Carregados do banco de dados oficial.")
-        load_data = db["calibers"][selected_caliber]["projectiles"][selected_projectile]["powders"][selected_powder]
-        final_min, final_max = load_data.get("min", 0.0), load_data.get("max", 0.0)
-        final_unit, final_note = load_data.get("unit", "grains"), load_data.get("note", "")
+        final_min, final_max = selected_load.get("min", 0.0), selected_load.get("max", 0.0)
+        final_unit, final_note = selected_load.get("unit", "grains"), selected_load.get("note", "")
         
         m1, m2, m3 = st.columns(3)
         m1.metric("Carga Mínima", f"{final_min} {final_unit}")
         m2.metric("Carga Máxima", f"{final_max} {final_unit}")
-        m3.metric("Velocidade", f"{load_data.get('velocity', 'N/A')} fps")
+        m3.metric("Velocidade", f"{selected_load.get('velocity', 'N/A')} fps")
         if final_note: st.info(f"Nota: {final_note}")
 
+    # --- Load Ladder (all steps computed and saved in one batch) ---
+    ladder_cal = selected_caliber if selected_caliber != "Outro" else manual_caliber
+    ladder_proj = selected_projectile if selected_projectile != "Outro" else manual_projectile
+    ladder_pow = selected_powder if selected_powder != "Outro" else manual_powder
+    if final_max > 0 and final_min <= final_max:
+        with st.expander("🪜 Escada de Carga (Load Ladder)", expanded=False):
+            st.caption(f"Gera as etapas entre {final_min} e {final_max} grains, registra todas no Logbook e imprime as etiquetas em um único PDF.")
+            l_col1, l_col2 = st.columns(2)
+            l_steps = l_col1.slider("Número de Etapas", 2, 15, 5, key="ladder_steps")
+            l_qty = l_col2.number_input("Munições por Etapa", min_value=1, value=10, step=1, key="ladder_qty")
+            l_primer = l_col1.text_input("Espoleta", key="ladder_primer")
+            l_case = l_col2.text_input("Estojo / Marca", key="ladder_case")
+            ladder_charges = charge_ladder(final_min, final_max, l_steps)
+            st.markdown("**Etapas:** " + " → ".join(f"{c:.1f}gr" for c in ladder_charges))
+
+            if st.button("Gerar Escada", use_container_width=True):
+                if "N/A" in (ladder_cal, ladder_proj, ladder_pow) or not ladder_cal:
+                    st.error("Informe calibre, projétil e pólvora.")
+                else:
+                    ladder_rows = create_ladder_sessions(
+                        session, st.session_state["user_id"], ladder_cal, ladder_proj, ladder_pow,
+                        ladder_charges, l_qty, primer=l_primer, case=l_case
+                    )
+                    consumption = consume_for_sessions(session, st.session_state["user_id"], ladder_rows)
+                    st.session_state["ladder_pdf"] = create_labels_pdf(ladder_rows, st.session_state.get("username")).getvalue()
+                    session.commit()
+                    st.success(f"{len(ladder_charges)} etapas registradas no Logbook.")
+                    for c in consumption.consumed:
+                        st.toast(f"Subtraído {c.amount:.2f}{c.unit} de {c.item_name}", icon="📦")
+
+            if st.session_state.get("ladder_pdf"):
+                st.download_button(
+                    label="🖨️ Etiquetas da Escada",
+                    data=st.session_state["ladder_pdf"],
+                    file_name=f"escada_{ladder_cal}.pdf",
+                    mime="application/pdf",
+                    key="dl_ladder"
+                )
+
 with tab2:
     if selected_powder == "Outro":
         st.markdown("### 🧪 Estimativa de Carga")
@@ -652,9 +793,71 @@ with tab2:
     else:
         st.info("A calculadora está disponível apenas no **Modo Manual** (Pólvora: Outro).")
 
+    # Catalog-fitted model: the caliber's powders with velocity data, one batched evaluation
+    st.divider()
+    st.markdown("### 📐 Modelo Ajustado pelo Catálogo")
+    st.caption("Coeficiente de energia por pólvora (v² · peso ∝ carga), ajustado a partir das velocidades publicadas no catálogo.")
+    powder_models = get_powder_models(catalog)
+    mdl_col1, mdl_col2 = st.columns(2)
+    mdl_weight = parse_projectile_weight(selected_projectile) if selected_projectile != "Outro" else None
+    mdl_weight = mdl_col1.number_input("Peso do Projétil (grains)", value=float(mdl_weight or 124.0), key="mdl_weight")
+    mdl_vels = mdl_col2.text_input("Velocidades Alvo (fps, separadas por vírgula)", value="950, 1050, 1150", key="mdl_vels")
+    try:
+        target_vels = [float(v) for v in mdl_vels.replace(";", ",").split(",") if v.strip()]
+    except ValueError:
+        target_vels = []
+        st.error("Velocidades inválidas.")
+
+    # Only powders the catalog lists for this caliber: a fit from rifle data says nothing about a pistol case
+    cal_powders = {e.powder for e in catalog.query(caliber=selected_caliber)} if selected_caliber != "Outro" else set()
+    if target_vels and cal_powders:
+        names, charges = estimate_charges(powder_models, target_vels, mdl_weight, sorted(cal_powders))
+    else:
+        names = []
+    if names:
+        import pandas as pd
+        mdl_df = pd.DataFrame(charges, index=names, columns=[f"{v:g} fps" for v in target_vels]).round(2)
+        mdl_df.insert(0, "Amostras", [powder_models[p].samples for p in names])
+        mdl_df.insert(1, "Erro Médio (%)", [
+            "N/A" if powder_models[p].rms_pct is None else f"{powder_models[p].rms_pct:.1f}" for p in names
+        ])
+        st.dataframe(mdl_df, use_container_width=True)
+        st.caption("⚠️ Estimativa estatística (grains). Nunca ultrapasse a carga máxima publicada pelo fabricante.")
+    elif target_vels:
+        st.info("Nenhuma pólvora do catálogo com dados de velocidade para este calibre.")
+
+# --- Keyset pagination state (one cursor stack per list) ---
+def _page_cursor(name, filters):
+    """Cursor of the page to show; back to the first page whenever the filters change."""
+    state = st.session_state.setdefault(f"{name}_pager", {"filters": None, "stack": [None]})
+    if state["filters"] != filters:
+        state["filters"], state["stack"] = filters, [None]
+    return state["stack"][-1]
+
+def _pager_controls(name, page):
+    state = st.session_state[f"{name}_pager"]
+    pg_col1, pg_col2, pg_col3 = st.columns([1, 2, 1])
+    if pg_col1.button("◀ Anterior", key=f"{name}_prev", disabled=len(state["stack"]) == 1, use_container_width=True):
+        state["stack"].pop()
+        st.rerun()
+    pg_col2.caption(f"Página {len(state['stack'])} · {page.total} registros")
+    if pg_col3.button("Próxima ▶", key=f"{name}_next", disabled=page.next_cursor is None, use_container_width=True):
+        state["stack"].append(page.next_cursor)
+        st.rerun()
+
+def _step_back_if_empty(name, page):
+    """Past the last row (e.g. it was just deleted): go back a page instead of showing an empty one."""
+    state = st.session_state[f"{name}_pager"]
+    if not page.rows and len(state["stack"]) > 1:
+        state["stack"].pop()
+        st.rerun()
+
+def _toggle_selected(state_key, item_id):
+    selected = st.session_state.setdefault(state_key, set())
+    selected.symmetric_difference_update({item_id})
+
 with tab3:
-    session = get_session()
-    user = session.query(User).get(st.session_state["user_id"])
+    user = ctx.load("firearms")
     
     log_tab, inv_tab = st.tabs(["📔 Sessões de Recarga", "📦 Estoque de Insumos"])
     
@@ -704,58 +907,13 @@ with tab3:
                     )
                     session.add(new_sess)
                     
-                    # --- Automatic Inventory Deduction ---
-                    inv_messages = []
-                    
-                    # 1. Deduct Powder
-                    if s_pow:
-                        powder_item = session.query(InventoryItem).filter(
-                            InventoryItem.user_id == user.id,
-                            InventoryItem.category == "Pólvora",
-                            InventoryItem.name.ilike(f"%{s_pow}%")
-                        ).first()
-                        if powder_item:
-                            needed_grains = s_charge * s_qty
-                            deduction = needed_grains
-                            # Conversion if stock is in grams (1g = 15.4324 grains)
-                            if powder_item.unit.lower() == "g":
-                                deduction = needed_grains / 15.4324
-                            
-                            powder_item.quantity -= deduction
-                            inv_messages.append(f"Subtraído {deduction:.2f}{powder_item.unit} de {powder_item.name}")
-
-                    # 2. Deduct Projectiles
-                    if s_proj:
-                        proj_item = session.query(InventoryItem).filter(
-                            InventoryItem.user_id == user.id,
-                            InventoryItem.category == "Projétil",
-                            InventoryItem.name.ilike(f"%{s_proj}%")
-                        ).first()
-                        if proj_item:
-                            proj_item.quantity -= s_qty
-                            inv_messages.append(f"Subtraído {s_qty}un de {proj_item.name}")
-
-                    # 3. Deduct Primers
-                    if s_primer:
-                        primer_item = session.query(InventoryItem).filter(
-                            InventoryItem.user_id == user.id,
-                            InventoryItem.category == "Espoleta",
-                            InventoryItem.name.ilike(f"%{s_primer}%")
-                        ).first()
-                        if primer_item:
-                            primer_item.quantity -= s_qty
-                            inv_messages.append(f"Subtraído {s_qty}un de {primer_item.name}")
-
-                    # 4. Deduct Cases
-                    if s_case:
-                        case_item = session.query(InventoryItem).filter(
-                            InventoryItem.user_id == user.id,
-                            InventoryItem.category == "Estojo",
-                            InventoryItem.name.ilike(f"%{s_case}%")
-                        ).first()
-                        if case_item:
-                            case_item.quantity -= s_qty
-                            inv_messages.append(f"Subtraído {s_qty}un de {case_item.name}")
+                    # --- Automatic Inventory Deduction (same transaction as the session) ---
+                    consumption = consume_for_session(session, new_sess)
+                    inv_messages = [
+                        f"Subtraído {c.amount:.2f}{c.unit} de {c.item_name}" if c.category == "Pólvora"
+                        else f"Subtraído {c.amount:g}un de {c.item_name}"
+                        for c in consumption.consumed
+                    ]
 
                     session.commit()
                     st.success("Sessão registrada com sucesso!")
@@ -764,36 +922,43 @@ with tab3:
                             st.toast(msg, icon="📦")
                     st.rerun()
 
+        # Sessions saved before lots existed get a cost computed once
+        if backfill_session_costs(session, user.id):
+            session.commit()
+
+        # Filters run in SQL; one page at a time via the (user_id, date, id) index
+        f_col1, f_col2, f_col3 = st.columns(3)
+        log_cal = f_col1.selectbox("Filtrar Calibre", ["Todos"] + session_calibers(session, user.id), key="log_f_cal")
+        log_pow = f_col2.text_input("Filtrar Pólvora", key="log_f_pow")
+        log_dates = f_col3.date_input("Período", value=(), format="DD/MM/YYYY", key="log_f_dates")
+        log_from, log_to = (tuple(log_dates) + (None, None))[:2]
+        log_filters = dict(
+            caliber=None if log_cal == "Todos" else log_cal,
+            powder=log_pow.strip() or None,
+            date_from=log_from,
+            date_to=log_to,
+        )
+        log_page = sessions_page(session, user.id, after=_page_cursor("log", log_filters), **log_filters)
+        _step_back_if_empty("log", log_page)
+
         # Display sessions
-        user_sessions = session.query(ReloadSession).filter_by(user_id=user.id).order_by(ReloadSession.date.desc()).all()
+        user_sessions = log_page.rows
+        selected_ids = st.session_state.setdefault("sel_sess_ids", set())
         if user_sessions:
             for s in user_sessions:
                 with st.container(border=True):
                     h_col1, h_col2, h_col3 = st.columns([1, 2, 1])
                     h_col1.markdown(f"**{s.date.strftime('%d/%m/%Y')}**")
                     h_col1.caption(f"{s.caliber}")
+                    # Selection lives in session_state so it survives paging
+                    h_col1.checkbox("Selecionar", value=s.id in selected_ids, key=f"sel_sess_{s.id}",
+                                    on_change=_toggle_selected, args=("sel_sess_ids", s.id))
                     
                     h_col2.markdown(f"**{s.quantity}un** com {s.charge}gr de {s.powder}")
                     h_col2.markdown(f"*{s.projectile}* | {s.primer} | {s.case}")
                     
-                    # --- Cost Calculation for Display ---
-                    def get_item_price(cat, name):
-                        it = session.query(InventoryItem).filter(InventoryItem.user_id == user.id, InventoryItem.category == cat, InventoryItem.name.ilike(f"%{name}%")).first()
-                        return it.price_unit if it else 0
-
-                    p_price = get_item_price("Pólvora", s.powder)
-                    proj_price = get_item_price("Projétil", s.projectile)
-                    prim_price = get_item_price("Espoleta", s.primer)
-                    case_price = get_item_price("Estojo", s.case)
-
-                    # Calc powder cost (grains to unit)
-                    powder_item = session.query(InventoryItem).filter(InventoryItem.user_id == user.id, InventoryItem.category == "Pólvora", InventoryItem.name.ilike(f"%{s.powder}%")).first()
-                    p_cost_unit = 0
-                    if powder_item:
-                        grains_per_unit = 1.0 if powder_item.unit.lower() == "grains" else 15.4324
-                        p_cost_unit = (s.charge / grains_per_unit) * powder_item.price_unit
-                    
-                    total_unit_cost = p_cost_unit + proj_price + prim_price + case_price
+                    # --- Cost per round (frozen at reload time from FIFO lots) ---
+                    total_unit_cost = s.cost_per_round or 0
                     
                     if total_unit_cost > 0:
                         h_col2.info(f"💰 Custo Est.: R$ {total_unit_cost:.2f} / munição")
@@ -809,15 +974,38 @@ with tab3:
                         session.commit()
                         st.rerun()
                     
-                    # Label Button
-                    label_pdf = create_label_pdf(s, user.username)
-                    st.download_button(
-                        label="🖨️ Etiqueta",
-                        data=label_pdf,
-                        file_name=f"label_{s.date}_{s.caliber}.pdf",
-                        mime="application/pdf",
-                        key=f"dl_lbl_{s.id}"
-                    )
+                    # Label Button (rendered on demand, then served from the label cache)
+                    if st.session_state.get(f"lbl_ready_{s.id}") or st.button("🖨️ Etiqueta", key=f"lbl_btn_{s.id}"):
+                        st.session_state[f"lbl_ready_{s.id}"] = True
+                        st.download_button(
+                            label="⬇️ Baixar Etiqueta",
+                            data=get_label_pdf(s, user.username),
+                            file_name=f"label_{s.date}_{s.caliber}.pdf",
+                            mime="application/pdf",
+                            key=f"dl_lbl_{s.id}"
+                        )
+
+            _pager_controls("log", log_page)
+
+            # --- Batch Labels: every selected session (any page) on multi-up A4 sheets ---
+            selected_sessions = session.query(ReloadSession).filter(
+                ReloadSession.user_id == user.id, ReloadSession.id.in_(selected_ids)
+            ).order_by(ReloadSession.date.desc(), ReloadSession.id.desc()).all() if selected_ids else []
+            st.markdown("#### 🖨️ Impressão em Lote")
+            b_col1, b_col2 = st.columns([2, 1])
+            sheet_layout = b_col1.selectbox("Folha de Etiquetas", list(LABEL_SHEETS), key="sheet_layout")
+            if b_col2.button(f"Imprimir Selecionadas ({len(selected_sessions)})", use_container_width=True, disabled=not selected_sessions):
+                st.session_state["batch_labels_pdf"] = create_label_sheet_pdf(selected_sessions, user.username, sheet_layout).getvalue()
+            if st.session_state.get("batch_labels_pdf"):
+                st.download_button(
+                    label="⬇️ Baixar Etiquetas Selecionadas",
+                    data=st.session_state["batch_labels_pdf"],
+                    file_name="etiquetas_recarga.pdf",
+                    mime="application/pdf",
+                    key="dl_batch_labels"
+                )
+        elif any(log_filters.values()):
+            st.info("Nenhuma sessão encontrada com esses filtros.")
         else:
             st.info("Nenhuma sessão de recarga registrada ainda.")
 
@@ -830,63 +1018,102 @@ with tab3:
                 i_cat = i_col1.selectbox("Categoria", ["Pólvora", "Projétil", "Espoleta", "Estojo", "Outro"])
                 i_name = i_col1.text_input("Nome/Marca")
                 i_qty = i_col2.number_input("Quantidade", min_value=0.0)
-                i_unit = i_col2.selectbox("Unidade", ["g", "grains", "un", "kg", "lb"])
+                i_unit = i_col2.selectbox("Unidade", DISPLAY_UNITS)
                 i_price = i_col2.number_input("Preço da Embalagem / Lote (R$)", min_value=0.0, step=0.01)
                 
                 if st.form_submit_button("Salvar no Estoque", use_container_width=True):
-                    unit_price = i_price / i_qty if i_qty > 0 else 0
-                    existing = session.query(InventoryItem).filter_by(user_id=user.id, category=i_cat, name=i_name).first()
-                    if existing:
-                        # Update quantity and average price
-                        total_qty = existing.quantity + i_qty
-                        if total_qty > 0:
-                            existing.price_unit = ((existing.quantity * existing.price_unit) + i_price) / total_qty
-                        existing.quantity = total_qty
-                        st.success(f"Estoque de {i_name} atualizado!")
+                    try:
+                        item, created = receive_stock(session, user.id, i_cat, i_name, i_qty, i_unit, i_price)
+                    except ValueError as e:
+                        st.error(str(e))
                     else:
-                        new_item = InventoryItem(user_id=user.id, category=i_cat, name=i_name, quantity=i_qty, unit=i_unit, price_unit=unit_price)
-                        session.add(new_item)
-                        st.success(f"{i_name} adicionado ao inventário!")
-                    session.commit()
-                    st.rerun()
+                        if created:
+                            st.success(f"{i_name} adicionado ao inventário!")
+                        else:
+                            st.success(f"Estoque de {item.name} atualizado!")
+                        session.commit()
+                        st.rerun()
         
-        # List inventory
-        items = session.query(InventoryItem).filter_by(user_id=user.id).all()
+        # Point-in-time stock from the ledger (latest snapshot + movements after it)
+        with st.expander("📅 Estoque em uma Data", expanded=False):
+            hist_date = st.date_input("Data", value=datetime.now(), format="DD/MM/YYYY", key="stock_hist_date")
+            hist_positions = stock_at(session, user.id, datetime.combine(hist_date, datetime.max.time()))
+            if hist_positions:
+                import pandas as pd
+                # Ledger quantities are in base units; removed items keep them
+                hist_units = dict(session.query(InventoryItem.id, InventoryItem.display_unit)
+                                  .filter(InventoryItem.user_id == user.id))
+                st.dataframe(pd.DataFrame([{
+                    "Categoria": p.category,
+                    "Item": p.name,
+                    "Quantidade": round(from_base(p.quantity, hist_units.get(p.item_id)), 2),
+                    "Unidade": hist_units.get(p.item_id) or "",
+                    "Valor (R$)": round(p.value, 2),
+                } for p in hist_positions]), use_container_width=True, hide_index=True)
+            else:
+                st.info("Nenhum estoque registrado nesta data.")
+
+        # Rounds each load can still make with this stock (cached per data version)
+        with st.expander("🧮 Quanto Posso Recarregar", expanded=False):
+            plan = get_build_capacity(session, user, user_catalog)
+            if plan:
+                import pandas as pd
+                plan_cal = st.selectbox("Calibre", ["Todos"] + sorted({c.caliber for c in plan}), key="plan_f_cal")
+                st.dataframe(pd.DataFrame([{
+                    "Calibre": c.caliber,
+                    "Projétil": c.projectile,
+                    "Pólvora": c.powder,
+                    "Carga Máx (gr)": round(c.charge, 2),
+                    "Espoleta": c.primer or "—",
+                    "Estojo": c.case or "—",
+                    "Munições": c.rounds,
+                    "Limitado por": c.bottleneck,
+                } for c in plan if plan_cal == "Todos" or c.caliber == plan_cal]), use_container_width=True, hide_index=True)
+                st.caption("Calculado com a carga máxima de cada receita. Espoleta e estojo vêm da sua última recarga do calibre.")
+            else:
+                st.info("Nenhuma receita usa a pólvora e o projétil do seu estoque.")
+
+        # List inventory (filtered and paginated in SQL)
+        if_col1, if_col2 = st.columns(2)
+        inv_cat = if_col1.selectbox("Filtrar Categoria", ["Todas", "Pólvora", "Projétil", "Espoleta", "Estojo", "Outro"], key="inv_f_cat")
+        inv_search = if_col2.text_input("Buscar Item", key="inv_f_search")
+        inv_filters = dict(category=None if inv_cat == "Todas" else inv_cat, search=inv_search.strip() or None)
+        inv_page = inventory_page(session, user.id, after=_page_cursor("inv", inv_filters), **inv_filters)
+        _step_back_if_empty("inv", inv_page)
+        items = inv_page.rows
         if items:
             for item in items:
                 with st.container(border=True):
                     i_c1, i_c2, i_c3 = st.columns([2, 2, 1])
                     i_c1.markdown(f"**{item.name}**")
                     i_c1.caption(item.category)
-                    i_c2.metric("Quantidade", f"{item.quantity:.2f} {item.unit}")
-                    i_c2.caption(f"Custo Médio: R$ {item.price_unit:.4f}/{item.unit}")
+                    shown_unit = item.display_unit or item.unit
+                    i_c2.metric("Quantidade", f"{from_base(item.quantity, shown_unit):.2f} {shown_unit}")
+                    i_c2.caption(f"Custo Médio: R$ {(item.price_unit or 0) * unit_factor(shown_unit):.4f}/{shown_unit}")
                     if i_c3.button("Remover", key=f"del_inv_{item.id}"):
-                        session.delete(item)
+                        remove_stock_item(session, item)
                         session.commit()
                         st.rerun()
+            _pager_controls("inv", inv_page)
+        elif any(inv_filters.values()):
+            st.info("Nenhum item encontrado com esses filtros.")
         else:
             st.info("Seu estoque está vazio.")
 
-    session.close()
-
 with tab4:
     import pandas as pd
-    session = get_session()
-    user = session.query(User).get(st.session_state["user_id"])
+    # Charts use the whole history; shared with the inspection report in tab5
+    user = ctx.load("sessions")
     
     st.markdown("### 📈 Performance Operacional")
     st.caption("Visualize a evolução da sua precisão e consistência ao longo do tempo.")
     
     # Filters
     perf_col1, perf_col2 = st.columns(2)
-    p_cal = perf_col1.multiselect("Filtrar por Calibre", options=list(set([s.caliber for s in user.sessions])), default=None)
+    p_cal = perf_col1.multiselect("Filtrar por Calibre", options=sorted({s.caliber for s in user.sessions}), default=None)
     
-    # Fetch Data
-    query = session.query(ReloadSession).filter_by(user_id=user.id)
-    if p_cal:
-        query = query.filter(ReloadSession.caliber.in_(p_cal))
-    
-    data = query.order_by(ReloadSession.date).all()
+    # Filter the already-loaded sessions
+    data = sorted((s for s in user.sessions if not p_cal or s.caliber in p_cal), key=lambda s: (s.date, s.id))
     
     if data:
         df = pd.DataFrame([{
@@ -933,6 +1160,27 @@ with tab4:
 
     else:
         st.info("Registre sessões no Logbook para visualizar os gráficos.")
+
+    # Cost report: aggregated in SQL from the per-round cost frozen at reload time
+    st.markdown("#### 💰 Custos de Recarga")
+    cost_col1, cost_col2 = st.columns(2)
+    cost_group = cost_col1.selectbox(
+        "Agrupar por", ["caliber", "month", "firearm"],
+        format_func={"caliber": "Calibre", "month": "Mês", "firearm": "Arma"}.get,
+    )
+    cost_dates = cost_col2.date_input("Período", value=(), format="DD/MM/YYYY", key="cost_f_dates")
+    cost_from, cost_to = (tuple(cost_dates) + (None, None))[:2]
+    cost_rows = cost_summary(session, st.session_state["user_id"], cost_group, cost_from, cost_to)
+    if cost_rows:
+        st.dataframe(pd.DataFrame([{
+            {"caliber": "Calibre", "month": "Mês", "firearm": "Arma"}[cost_group]: r.group or "—",
+            "Sessões": r.sessions,
+            "Munições": r.rounds,
+            "Custo Total (R$)": r.total_cost,
+            "Custo/Munição (R$)": r.avg_cost_per_round,
+        } for r in cost_rows]), hide_index=True, use_container_width=True)
+    else:
+        st.caption("Sem sessões no período.")
     
     st.divider()
     st.markdown("#### 📋 Detalhamento por Recarga")
@@ -1212,12 +1460,10 @@ with tab4:
             else:
                 st.warning("Adicione impactos (círculos) no alvo para calcular.")
     
-    show_ad()
-    session.close()
+    show_ad(user)
 
 with tab5:
-    session = get_session()
-    user = session.query(User).get(st.session_state["user_id"])
+    user = ctx.load("firearms")
     
     st.markdown("### 👤 Perfil do Atirador")
     st.info("Mantenha seus dados atualizados conforme a legislação vigente (Decreto 11.615/2023).")
@@ -1308,12 +1554,12 @@ with tab5:
     # Setting Biometrics in Profile
     st.divider()
     st.markdown("### 🔐 Segurança")
-    is_bio_active = check_biometrics_available() == user.username
+    is_bio_active = is_biometrics_enabled(user.username)
     
     if is_bio_active:
         st.success("✅ Login Biométrico Ativado neste dispositivo.")
         if st.button("Desativar Biometria", use_container_width=True):
-            clear_biometrics()
+            clear_biometrics(user.username)
             st.rerun()
     else:
         if st.button("Ativar Login Biométrico", use_container_width=True):
@@ -1353,7 +1599,7 @@ with tab5:
     rep_col1.markdown("### 📄 Relatório / Vistoria")
     rep_col1.caption("Gere um relatório PDF oficial contendo seus dados de acervo e histórico recente de recargas para apresentação em vistorias.")
     
-    report_pdf = create_inspection_report(user)
+    report_pdf = get_inspection_report(session, user)
     rep_col2.download_button(
         label="🖨️ Baixar Relatório",
         data=report_pdf,
@@ -1361,6 +1607,20 @@ with tab5:
         mime="application/pdf"
     )
 
+    # Full history for audits: built on demand, streamed page by page from the DB
+    rep_col1.caption("Para auditorias, o relatório completo inclui todo o histórico de recargas.")
+    # Served only in the run that built it: kept in session_state, every
+    # full report would stay in memory for the rest of the session
+    if rep_col2.button("📚 Relatório Completo"):
+        with st.spinner("Gerando relatório completo..."):
+            with create_full_history_report(session, user) as full_report:
+                rep_col2.download_button(
+                    label="⬇️ Baixar Completo",
+                    data=full_report.read(),
+                    file_name=f"relatorio_completo_{user.username}.pdf",
+                    mime="application/pdf"
+                )
+
     st.divider()
     st.markdown("### 🔫 Minhas Armas (Acervo)")
     
@@ -1429,7 +1689,6 @@ with tab5:
                         st.rerun()
     else:
         st.info("Nenhuma arma cadastrada.")
-    session.close()
 
 # Tactical Range Card Summary
 st.divider()
@@ -1440,3 +1699,4 @@ display_pow = selected_powder if selected_powder != "Outro" else locals().get('m
 st.markdown("---")
 st.caption("© 2026 BALLISTIC TACTICAL ASSISTANT | FIELD READY SYSTEM")
 
+ctx.close()
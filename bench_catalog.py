@@ -0,0 +1,88 @@
+"""
+Cold-load benchmark: database.json vs the compiled SQLite catalog.
+
+Each measurement opens the catalog and resolves the first sidebar screen
+(caliber list, projectiles, powders, one load) in a fresh interpreter, so
+nothing is cached in-process (the same situation as app startup or a new
+worker). --scale replicates the calibers N times to approximate larger
+imported manufacturer tables.
+
+Usage:
+    python bench_catalog.py [--scale 50] [--runs 5]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from catalog import CATALOG_FILE, compiled_path_for
+from catalog_compile import compile_catalog
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_CHILD = """
+import sys, time
+sys.path.insert(0, {here!r})
+import catalog
+t0 = time.perf_counter()
+if {compiled!r}:
+    cat = catalog.load_compiled_catalog({compiled_path!r}, path={json_path!r})
+else:
+    import json
+    with open({json_path!r}) as f:
+        cat = catalog.LoadCatalog.from_json_data(json.load(f), path={json_path!r})
+# First screen: caliber list, then the first projectile/powder/load lookup
+cal = cat.calibers[0]
+proj = cat.projectiles(cal)[0]
+cat.get_load(cal, proj, cat.powders(cal, proj)[0])
+print(time.perf_counter() - t0, len(cat.calibers))
+"""
+
+
+def _scaled_copy(src, dst, scale):
+    with open(src) as f:
+        data = json.load(f)
+    if scale > 1:
+        calibers = data["calibers"]
+        data["calibers"] = {
+            f"{name} #{i}" if i else name: cal
+            for i in range(scale) for name, cal in calibers.items()
+        }
+    with open(dst, "w") as f:
+        json.dump(data, f)
+
+
+def _cold_load(json_path, compiled):
+    code = _CHILD.format(here=HERE, compiled=compiled, compiled_path=compiled_path_for(json_path), json_path=json_path)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+    return float(out[0]), int(out[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_catalog_")
+    try:
+        json_path = os.path.join(tmp_dir, "database.json")
+        _scaled_copy(os.path.join(HERE, CATALOG_FILE), json_path, args.scale)
+        compiled_path, count = compile_catalog(json_path)
+
+        print(f"Cargas: {count}  |  JSON: {os.path.getsize(json_path) / 1024:.0f} KB  |  "
+              f"SQLite: {os.path.getsize(compiled_path) / 1024:.0f} KB")
+        for label, compiled in (("JSON", False), ("SQLite (mmap)", True)):
+            times = [_cold_load(json_path, compiled)[0] for _ in range(args.runs)]
+            print(f"{label:<14} mediana {statistics.median(times) * 1000:8.2f} ms   "
+                  f"min {min(times) * 1000:8.2f} ms   ({args.runs} execuções)")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Login throughput benchmark: bcrypt verification at several work factors.
+
+Simulates a burst of logins: --clients threads (browser sessions) each
+verify a password --logins times in total. Every cost is measured two
+ways:
+
+    inline   bcrypt called directly on each client thread (before)
+    pool     passwords.verify_password() on the bounded worker pool
+
+and reports logins per second plus the median latency one client sees.
+
+Usage:
+    python bench_login.py [--costs 10 11 12 13] [--clients 16] [--logins 64]
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+import passwords
+
+PASSWORD = "senha123"
+
+
+def _inline(password_hash):
+    return bcrypt.checkpw(PASSWORD.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def _pooled(password_hash):
+    return passwords.verify_password(PASSWORD, password_hash)
+
+
+def _burst(verify, password_hash, clients, logins):
+    """(logins per second, median latency in s) for `logins` verifications from `clients` threads."""
+    def one():
+        t0 = time.perf_counter()
+        assert verify(password_hash)
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=clients) as burst:
+        t0 = time.perf_counter()
+        latencies = list(burst.map(lambda _: one(), range(logins)))
+        elapsed = time.perf_counter() - t0
+    return logins / elapsed, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--costs", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"Workers no pool: {passwords.HASH_WORKERS}  |  clientes: {args.clients}  |  logins por medição: {args.logins}")
+    print(f"{'custo':>5}  {'modo':<7} {'logins/s':>9}  {'latência mediana':>17}")
+    for cost in args.costs:
+        password_hash = passwords.hash_password(PASSWORD, rounds=cost)
+        for label, verify in (("inline", _inline), ("pool", _pooled)):
+            rate, latency = _burst(verify, password_hash, args.clients, args.logins)
+            print(f"{cost:>5}  {label:<7} {rate:9.1f}  {latency * 1000:14.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
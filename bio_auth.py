@@ -1,27 +1,149 @@
+"""
+Credenciais biométricas salvas neste dispositivo (device_config.json).
+
+CredentialStore mantém o arquivo já interpretado em memória. As checagens
+do login e da aba de perfil (a cada rerun) não abrem o arquivo: no máximo
+um os.stat() a cada CHECK_INTERVAL segundos, e só relê o JSON quando o
+mtime mudou (outro processo alterou o arquivo). Escritas são atômicas
+(arquivo temporário + os.replace), então um leitor nunca vê JSON pela
+metade. O mesmo dispositivo pode guardar vários usuários.
+
+Formato: {"users": [...], "last_user": ..., "biometrics_enabled": true}.
+Arquivos antigos, só com last_user, continuam válidos.
+"""
 import json
 import os
+import tempfile
+import threading
+import time
 
 CONFIG_FILE = "device_config.json"
+CHECK_INTERVAL = 2.0 # segundos entre verificações de mtime
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class CredentialStore:
+    def __init__(self, path=CONFIG_FILE, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._users = ()
+        self._last_user = None
+        self._mtime = None
+        self._checked_at = None
+
+    def _parse(self, data):
+        if not isinstance(data, dict) or not data.get("biometrics_enabled"):
+            return (), None
+        users = [u for u in data.get("users") or [] if isinstance(u, str) and u]
+        last = data.get("last_user")
+        if last and last not in users:
+            users.insert(0, last)
+        return tuple(users), last if last in users else (users[0] if users else None)
+
+    def _refresh(self):
+        """Recarrega o arquivo se o mtime mudou; chamado com o lock."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        mtime = _mtime(self.path)
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        self._users, self._last_user = (), None
+        if mtime is not None:
+            try:
+                with open(self.path, "r") as f:
+                    self._users, self._last_user = self._parse(json.load(f))
+            except (OSError, ValueError):
+                pass
+
+    def _write(self, users, last_user):
+        """Grava de forma atômica e atualiza o cache; chamado com o lock."""
+        if not users:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        else:
+            config = {"users": list(users), "last_user": last_user, "biometrics_enabled": True}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".device_config.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(config, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        self._users, self._last_user = tuple(users), last_user if users else None
+        self._mtime = _mtime(self.path)
+        self._checked_at = time.monotonic()
+
+    def users(self):
+        """Usuários salvos, o mais recente primeiro."""
+        with self._lock:
+            self._refresh()
+            return self._users
+
+    def last_user(self):
+        with self._lock:
+            self._refresh()
+            return self._last_user
+
+    def is_enabled(self, username):
+        return username in self.users()
+
+    def save(self, username):
+        """Habilita o usuário neste dispositivo e o torna o último usado."""
+        with self._lock:
+            self._checked_at = None # escreve sobre o estado atual do arquivo
+            self._refresh()
+            users = [username] + [u for u in self._users if u != username]
+            self._write(users, username)
+
+    def remove(self, username=None):
+        """Remove um usuário salvo, ou todos se username for None."""
+        with self._lock:
+            self._checked_at = None
+            self._refresh()
+            users = [u for u in self._users if username is not None and u != username]
+            if username is not None and tuple(users) == self._users:
+                return
+            last = self._last_user if self._last_user in users else (users[0] if users else None)
+            self._write(users, last)
+
+
+_store = CredentialStore()
+
 
 def save_biometrics(username):
     """Salva o usuário atual como habilitado para login biométrico neste dispositivo."""
-    config = {"last_user": username, "biometrics_enabled": True}
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f)
+    _store.save(username)
 
-def clear_biometrics():
-    """Remove as credenciais biométricas salvas."""
-    if os.path.exists(CONFIG_FILE):
-        os.remove(CONFIG_FILE)
+def clear_biometrics(username=None):
+    """Remove as credenciais biométricas salvas (de um usuário, ou de todos)."""
+    _store.remove(username)
 
 def check_biometrics_available():
-    """Verifica se há um usuário salvo para biometria."""
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, "r") as f:
-                data = json.load(f)
-                if data.get("biometrics_enabled") and data.get("last_user"):
-                    return data["last_user"]
-        except:
-            return None
-    return None
+    """Verifica se há um usuário salvo para biometria; retorna o último usado."""
+    return _store.last_user()
+
+def saved_biometric_users():
+    """Todos os usuários com biometria neste dispositivo, o mais recente primeiro."""
+    return _store.users()
+
+def is_biometrics_enabled(username):
+    return _store.is_enabled(username)
@@ -0,0 +1,494 @@
+import bisect
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+
+from components import register_brand_aliases
+
+CATALOG_FILE = "database.json"
+
+# Flat record for one catalog load, returned by the reverse-index queries
+LoadEntry = namedtuple("LoadEntry", "caliber projectile powder min max unit velocity note")
+
+_WEIGHT_RE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*gr", re.IGNORECASE)
+
+
+def parse_projectile_weight(projectile):
+    """Extracts the weight in grains from names like '124gr FMJ' (None if absent)."""
+    match = _WEIGHT_RE.match(projectile or "")
+    if not match:
+        return None
+    return float(match.group(1).replace(",", "."))
+
+
+class _VelocityBucket:
+    """Index bucket kept sorted by velocity so range filters are a bisect."""
+
+    def __init__(self, entries):
+        with_vel = sorted((e for e in entries if e.velocity is not None), key=lambda e: e.velocity)
+        self.entries = tuple(with_vel) + tuple(e for e in entries if e.velocity is None)
+        self.velocities = [e.velocity for e in with_vel]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def select(self, min_velocity=None, max_velocity=None):
+        if min_velocity is None and max_velocity is None:
+            return self.entries
+        lo = 0 if min_velocity is None else bisect.bisect_left(self.velocities, min_velocity)
+        hi = len(self.velocities) if max_velocity is None else bisect.bisect_right(self.velocities, max_velocity)
+        return self.entries[lo:hi]
+
+
+class LoadCatalog:
+    """
+    Read-only, indexed view over the load database (database.json).
+
+    Built once per process and shared by every Streamlit session, so the
+    sorted selectbox lists and the (caliber, projectile, powder) -> load
+    lookups are computed a single time instead of on every rerun.
+    Lists are exposed as tuples so callers cannot mutate shared state.
+
+    Reverse indexes (powder -> loads, projectile weight -> loads, caliber
+    -> loads) are built alongside, each bucket sorted by velocity, so
+    queries like "all 124gr loads above 1100 fps" never walk the nested JSON.
+    They are built lazily on the first reverse query, so plain navigation
+    (and process startup) does not pay for them.
+    """
+
+    def __init__(self, caliber_info, loads, powders_metadata, path=CATALOG_FILE, mtime=None):
+        """
+        caliber_info: {caliber: {max_oal, max_case, ...}} (no nested projectiles)
+        loads: iterable of ((caliber, projectile, powder), load_dict)
+        """
+        self.path = path
+        self.mtime = mtime
+        self.powders_metadata = powders_metadata
+        self._caliber_info = caliber_info
+        self._loads = dict(loads)
+
+        projectiles, powders = {}, {}
+        for cal, proj, powder in self._loads:
+            projectiles.setdefault(cal, set()).add(proj)
+            powders.setdefault((cal, proj), set()).add(powder)
+
+        self.calibers = tuple(sorted(set(caliber_info) | set(projectiles)))
+        self._projectiles = {k: tuple(sorted(v)) for k, v in projectiles.items()}
+        self._powders = {k: tuple(sorted(v)) for k, v in powders.items()}
+        # Needed at startup (brand aliases), so taken from the forward lists, not the reverse indexes
+        self._powder_names = tuple(sorted(set().union(*powders.values())))
+
+        # Reverse indexes are built on first use (search mode), not at startup
+        self._indexed = False
+        self._index_lock = threading.Lock()
+
+    def _ensure_indexes(self):
+        if self._indexed:
+            return
+        with self._index_lock:
+            if not self._indexed:
+                self._build_indexes()
+                self._indexed = True
+
+    def _build_indexes(self):
+        by_powder, by_weight, by_caliber = {}, {}, {}
+        entries = []
+        for (cal, proj, powder), load in self._loads.items():
+            entry = LoadEntry(
+                cal, proj, powder,
+                load.get("min"), load.get("max"), load.get("unit", "grains"),
+                load.get("velocity"), load.get("note", ""),
+            )
+            entries.append(entry)
+            by_powder.setdefault(powder, []).append(entry)
+            by_caliber.setdefault(cal, []).append(entry)
+            weight = parse_projectile_weight(proj)
+            if weight is not None:
+                by_weight.setdefault(weight, []).append(entry)
+
+        self._all = _VelocityBucket(entries)
+        self._by_powder = {k: _VelocityBucket(v) for k, v in by_powder.items()}
+        self._by_weight = {k: _VelocityBucket(v) for k, v in by_weight.items()}
+        self._by_caliber = {k: _VelocityBucket(v) for k, v in by_caliber.items()}
+        self._projectile_weights = tuple(sorted(by_weight))
+
+    @classmethod
+    def from_json_data(cls, data, path=CATALOG_FILE, mtime=None):
+        """Builds the catalog from the nested database.json structure."""
+        caliber_info, loads = {}, []
+        for cal, cal_data in data.get("calibers", {}).items():
+            # Dimensions (max_oal, max_case, ...) without the nested projectiles
+            caliber_info[cal] = {k: v for k, v in cal_data.items() if k != "projectiles"}
+            for proj, proj_data in cal_data.get("projectiles", {}).items():
+                for powder, load in proj_data.get("powders", {}).items():
+                    loads.append(((cal, proj, powder), load))
+        return cls(caliber_info, loads, data.get("powders_metadata", {}), path=path, mtime=mtime)
+
+    def __len__(self):
+        return len(self._loads)
+
+    def projectiles(self, caliber):
+        """Sorted projectile names available for a caliber."""
+        return self._projectiles.get(caliber, ())
+
+    def powders(self, caliber, projectile):
+        """Sorted powder names available for a caliber/projectile pair."""
+        return self._powders.get((caliber, projectile), ())
+
+    def get_load(self, caliber, projectile, powder):
+        """Returns the load dict (min, max, unit, velocity, note) or None."""
+        return self._loads.get((caliber, projectile, powder))
+
+    def caliber_info(self, caliber):
+        """Caliber dimensions (max_oal, max_case, proj_dia, base_dia)."""
+        return self._caliber_info.get(caliber, {})
+
+    def powder_info(self, powder):
+        """Powder metadata (format, density, app) or None."""
+        return self.powders_metadata.get(powder)
+
+    # --- Reverse index queries ---
+
+    @property
+    def powder_names(self):
+        return self._powder_names
+
+    @property
+    def projectile_weights(self):
+        self._ensure_indexes()
+        return self._projectile_weights
+
+    def loads_by_powder(self, powder):
+        """Every load that uses the given powder, sorted by velocity."""
+        self._ensure_indexes()
+        bucket = self._by_powder.get(powder)
+        return bucket.entries if bucket else ()
+
+    def loads_by_weight(self, weight):
+        """Every load whose projectile weighs `weight` grains, sorted by velocity."""
+        self._ensure_indexes()
+        bucket = self._by_weight.get(float(weight))
+        return bucket.entries if bucket else ()
+
+    def loads_in_velocity_range(self, min_velocity=None, max_velocity=None):
+        """Loads with a published velocity inside [min_velocity, max_velocity] fps."""
+        self._ensure_indexes()
+        return self._all.select(min_velocity, max_velocity)
+
+    def query(self, powder=None, weight=None, caliber=None, min_velocity=None, max_velocity=None):
+        """
+        Combined search. The smallest matching index bucket is picked as the
+        driver and range-filtered by bisect; the remaining criteria are
+        checked only against that (already small) candidate set.
+        When a velocity bound is given, loads without velocity are excluded.
+        """
+        self._ensure_indexes()
+        candidates = [self._all]
+        if powder is not None:
+            candidates.append(self._by_powder.get(powder))
+        if weight is not None:
+            candidates.append(self._by_weight.get(float(weight)))
+        if caliber is not None:
+            candidates.append(self._by_caliber.get(caliber))
+        if any(bucket is None for bucket in candidates):
+            return []
+
+        driver = min(candidates, key=len)
+        results = driver.select(min_velocity, max_velocity)
+        if powder is not None and driver is not self._by_powder[powder]:
+            results = [e for e in results if e.powder == powder]
+        if weight is not None and driver is not self._by_weight[float(weight)]:
+            results = [e for e in results if parse_projectile_weight(e.projectile) == float(weight)]
+        if caliber is not None and driver is not self._by_caliber[caliber]:
+            results = [e for e in results if e.caliber == caliber]
+        return list(results)
+
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_catalog(path=CATALOG_FILE):
+    """
+    Builds a fresh LoadCatalog. The compiled SQLite catalog is used when it
+    was produced from the current database.json; otherwise the JSON (the
+    source of truth) is parsed directly.
+    """
+    mtime = _file_mtime(path)
+    if mtime is None:
+        return LoadCatalog({}, [], {}, path=path, mtime=None)
+
+    compiled = compiled_path_for(path)
+    if compiled_is_fresh(compiled, mtime):
+        try:
+            return load_compiled_catalog(compiled, path=path, mtime=mtime)
+        except sqlite3.Error as e:
+            print(f"Compiled catalog unreadable, falling back to JSON: {e}")
+
+    with open(path, "r") as f:
+        data = json.load(f)
+    return LoadCatalog.from_json_data(data, path=path, mtime=mtime)
+
+
+# --- Compiled (SQLite) catalog ---
+# Produced by catalog_compile.py. Opened read-only and memory-mapped, so a
+# fresh process or worker reads fixed-width rows instead of parsing JSON.
+
+COMPILED_FORMAT_VERSION = "2"
+MMAP_SIZE = 64 * 1024 * 1024
+
+
+def compiled_path_for(path):
+    return os.path.splitext(path)[0] + ".catalog.db"
+
+
+def open_compiled(compiled_path):
+    """Read-only, memory-mapped connection to a compiled catalog."""
+    uri = f"file:{os.path.abspath(compiled_path)}?mode=ro&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    return conn
+
+
+def compiled_is_fresh(compiled_path, source_mtime):
+    """True when the compiled file exists and was built from this JSON revision."""
+    if source_mtime is None or not os.path.exists(compiled_path):
+        return False
+    try:
+        conn = open_compiled(compiled_path)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return (meta.get("format_version") == COMPILED_FORMAT_VERSION
+            and meta.get("source_mtime_ns") == str(source_mtime))
+
+
+_LOAD_COLUMNS = "caliber, projectile, powder, min, max, unit, velocity, note"
+
+
+def _load_dict(lo, hi, unit, velocity, note):
+    load = {"min": lo, "max": hi, "unit": unit, "velocity": velocity, "note": note}
+    # Missing JSON keys come back as NULL; drop them so .get() defaults still apply
+    return {k: v for k, v in load.items() if v is not None}
+
+
+class CompiledLoadCatalog:
+    """
+    Same interface as LoadCatalog, answered from the memory-mapped SQLite
+    file instead of in-memory dicts. Opening it reads only the caliber
+    names; projectile/powder lists and loads are fetched by primary-key
+    range on first access and memoized, and reverse queries use the
+    (powder, velocity) / (weight, velocity) indexes built at compile time.
+    """
+
+    def __init__(self, compiled_path, path=CATALOG_FILE, mtime=None):
+        self.path = path
+        self.mtime = mtime
+        self.compiled_path = compiled_path
+        self._conn = open_compiled(compiled_path)
+        self._lock = threading.Lock()
+        self.calibers = tuple(name for (name,) in self._fetch("SELECT name FROM calibers ORDER BY name"))
+        self._projectiles = {}
+        self._powders = {}
+        self._loads = {}
+        self._caliber_info = {}
+        self._powder_info = {}
+        self._powder_names = None
+        self._projectile_weights = None
+
+    def _fetch(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def __len__(self):
+        return self._fetch("SELECT COUNT(*) FROM loads")[0][0]
+
+    def projectiles(self, caliber):
+        if caliber not in self._projectiles:
+            rows = self._fetch("SELECT DISTINCT projectile FROM loads WHERE caliber = ? ORDER BY projectile", (caliber,))
+            self._projectiles[caliber] = tuple(r[0] for r in rows)
+        return self._projectiles[caliber]
+
+    def powders(self, caliber, projectile):
+        key = (caliber, projectile)
+        if key not in self._powders:
+            rows = self._fetch("SELECT powder FROM loads WHERE caliber = ? AND projectile = ? ORDER BY powder", key)
+            self._powders[key] = tuple(r[0] for r in rows)
+        return self._powders[key]
+
+    def get_load(self, caliber, projectile, powder):
+        key = (caliber, projectile, powder)
+        if key not in self._loads:
+            rows = self._fetch(
+                "SELECT min, max, unit, velocity, note FROM loads WHERE caliber = ? AND projectile = ? AND powder = ?", key
+            )
+            self._loads[key] = _load_dict(*rows[0]) if rows else None
+        return self._loads[key]
+
+    def caliber_info(self, caliber):
+        if caliber not in self._caliber_info:
+            rows = self._fetch("SELECT info FROM calibers WHERE name = ?", (caliber,))
+            self._caliber_info[caliber] = json.loads(rows[0][0]) if rows else {}
+        return self._caliber_info[caliber]
+
+    def powder_info(self, powder):
+        if powder not in self._powder_info:
+            rows = self._fetch("SELECT info FROM powders WHERE name = ?", (powder,))
+            self._powder_info[powder] = json.loads(rows[0][0]) if rows else None
+        return self._powder_info[powder]
+
+    @property
+    def powders_metadata(self):
+        return {name: json.loads(info) for name, info in self._fetch("SELECT name, info FROM powders")}
+
+    @property
+    def powder_names(self):
+        if self._powder_names is None:
+            self._powder_names = tuple(r[0] for r in self._fetch("SELECT DISTINCT powder FROM loads ORDER BY powder"))
+        return self._powder_names
+
+    @property
+    def projectile_weights(self):
+        if self._projectile_weights is None:
+            self._projectile_weights = tuple(
+                r[0] for r in self._fetch("SELECT DISTINCT weight FROM loads WHERE weight IS NOT NULL ORDER BY weight")
+            )
+        return self._projectile_weights
+
+    def loads_by_powder(self, powder):
+        return tuple(self.query(powder=powder))
+
+    def loads_by_weight(self, weight):
+        return tuple(self.query(weight=weight))
+
+    def loads_in_velocity_range(self, min_velocity=None, max_velocity=None):
+        return tuple(self.query(min_velocity=min_velocity, max_velocity=max_velocity))
+
+    def query(self, powder=None, weight=None, caliber=None, min_velocity=None, max_velocity=None):
+        clauses, params = [], []
+        for column, value in (("powder", powder), ("weight", weight), ("caliber", caliber)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(float(value) if column == "weight" else value)
+        if min_velocity is not None:
+            clauses.append("velocity >= ?")
+            params.append(min_velocity)
+        if max_velocity is not None:
+            clauses.append("velocity <= ?")
+            params.append(max_velocity)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._fetch(f"SELECT {_LOAD_COLUMNS} FROM loads {where} ORDER BY velocity IS NULL, velocity", params)
+        return [LoadEntry(cal, proj, pw, lo, hi, unit or "grains", vel, note or "")
+                for cal, proj, pw, lo, hi, unit, vel, note in rows]
+
+
+def load_compiled_catalog(compiled_path, path=CATALOG_FILE, mtime=None):
+    return CompiledLoadCatalog(compiled_path, path=path, mtime=mtime)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(path=CATALOG_FILE):
+    """
+    Returns the process-wide catalog, reloading it only when the file's
+    mtime changes. Safe to call from concurrent Streamlit sessions.
+    """
+    global _catalog
+    mtime = _file_mtime(path)
+    current = _catalog
+    if current is not None and current.path == path and current.mtime == mtime:
+        return current
+
+    with _catalog_lock:
+        # Another session may have reloaded while we waited for the lock
+        if _catalog is None or _catalog.path != path or _catalog.mtime != mtime:
+            _catalog = load_catalog(path)
+            # Once per catalog revision: "216" finds the "CBC 216" stock item
+            register_brand_aliases(_catalog.powder_names)
+        return _catalog
+
+
+class UserCatalog:
+    """
+    Per-user layer over the shared catalog (copy-on-read).
+
+    Only the user's own custom loads are held here; every lookup falls
+    through to the shared base catalog, which is never copied, so memory per
+    user stays proportional to their custom loads. A custom load with the
+    same (caliber, projectile, powder) key shadows the base entry.
+    """
+
+    def __init__(self, base, custom_loads):
+        """custom_loads: {(caliber, projectile, powder): load_dict}"""
+        self.base = base
+        self.custom_loads = custom_loads
+        self._projectiles, self._powders = {}, {}
+        for cal, proj, powder in custom_loads:
+            self._projectiles.setdefault(cal, set()).add(proj)
+            self._powders.setdefault((cal, proj), set()).add(powder)
+
+    @staticmethod
+    def _merge(base_items, extra):
+        if not extra:
+            return base_items
+        return tuple(sorted(set(base_items) | extra))
+
+    @property
+    def calibers(self):
+        return self._merge(self.base.calibers, set(self._projectiles))
+
+    def projectiles(self, caliber):
+        return self._merge(self.base.projectiles(caliber), self._projectiles.get(caliber))
+
+    def powders(self, caliber, projectile):
+        return self._merge(self.base.powders(caliber, projectile), self._powders.get((caliber, projectile)))
+
+    def get_load(self, caliber, projectile, powder):
+        key = (caliber, projectile, powder)
+        if key in self.custom_loads:
+            return self.custom_loads[key]
+        return self.base.get_load(*key)
+
+    def is_custom(self, caliber, projectile, powder):
+        return (caliber, projectile, powder) in self.custom_loads
+
+    def caliber_info(self, caliber):
+        return self.base.caliber_info(caliber)
+
+    def powder_info(self, powder):
+        return self.base.powder_info(powder)
+
+    @property
+    def powder_names(self):
+        return self._merge(self.base.powder_names, {k[2] for k in self.custom_loads})
+
+    @property
+    def projectile_weights(self):
+        weights = {parse_projectile_weight(k[1]) for k in self.custom_loads} - {None}
+        return self._merge(self.base.projectile_weights, weights)
+
+    def query(self, powder=None, weight=None, caliber=None, min_velocity=None, max_velocity=None):
+        results = [e for e in self.base.query(powder, weight, caliber, min_velocity, max_velocity)
+                   if (e.caliber, e.projectile, e.powder) not in self.custom_loads]
+        for (cal, proj, pw), load in self.custom_loads.items():
+            velocity = load.get("velocity")
+            if ((powder is not None and pw != powder)
+                    or (caliber is not None and cal != caliber)
+                    or (weight is not None and parse_projectile_weight(proj) != float(weight))
+                    or (min_velocity is not None and (velocity is None or velocity < min_velocity))
+                    or (max_velocity is not None and (velocity is None or velocity > max_velocity))):
+                continue
+            results.append(LoadEntry(cal, proj, pw, load.get("min"), load.get("max"),
+                                     load.get("unit", "grains"), velocity, load.get("note", "")))
+        return sorted(results, key=lambda e: (e.velocity is None, e.velocity or 0))
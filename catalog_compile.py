@@ -0,0 +1,186 @@
+"""
+Compiles database.json (calibers + powders_metadata) into a read-only SQLite
+catalog that the app opens memory-mapped instead of parsing JSON.
+
+database.json remains the source of truth: the compiled file records the
+JSON mtime it was built from and is ignored by the app when stale.
+export_json() writes the JSON back from a catalog database row by row
+(used by catalog_ingest.py), preserving the original key order.
+
+Usage:
+    python catalog_compile.py [database.json] [-o database.catalog.db]
+"""
+import argparse
+import json
+import os
+import sqlite3
+
+from catalog import CATALOG_FILE, COMPILED_FORMAT_VERSION, compiled_path_for, parse_projectile_weight
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE calibers (name TEXT PRIMARY KEY, info TEXT NOT NULL);
+CREATE TABLE powders (name TEXT PRIMARY KEY, info TEXT NOT NULL);
+-- velocity has no declared type so JSON ints stay ints (no REAL affinity)
+-- seq keeps the JSON insertion order for export_json()
+CREATE TABLE loads (
+    caliber TEXT NOT NULL,
+    projectile TEXT NOT NULL,
+    powder TEXT NOT NULL,
+    min REAL,
+    max REAL,
+    unit TEXT,
+    velocity,
+    note TEXT,
+    weight REAL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (caliber, projectile, powder)
+) WITHOUT ROWID;
+CREATE INDEX ix_loads_powder ON loads (powder, velocity);
+CREATE INDEX ix_loads_weight ON loads (weight, velocity);
+CREATE INDEX ix_loads_velocity ON loads (velocity);
+"""
+
+LOAD_INSERT = "INSERT INTO loads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def iter_load_rows(data):
+    seq = 0
+    for cal, cal_data in data.get("calibers", {}).items():
+        for proj, proj_data in cal_data.get("projectiles", {}).items():
+            weight = parse_projectile_weight(proj)
+            for powder, load in proj_data.get("powders", {}).items():
+                yield (
+                    cal, proj, powder,
+                    load.get("min"), load.get("max"), load.get("unit"),
+                    load.get("velocity"), load.get("note"), weight, seq,
+                )
+                seq += 1
+
+
+def write_meta(conn, source_mtime):
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+        [("format_version", COMPILED_FORMAT_VERSION), ("source_mtime_ns", str(source_mtime))]
+    )
+
+
+def compile_catalog(json_path=CATALOG_FILE, out_path=None):
+    """
+    Writes the compiled catalog next to the JSON (or to out_path).
+    The file is built under a temporary name and renamed into place, so a
+    running app never opens a half-written catalog.
+    Returns (out_path, number_of_loads).
+    """
+    out_path = out_path or compiled_path_for(json_path)
+    source_mtime = os.stat(json_path).st_mtime_ns
+    with open(json_path, "r") as f:
+        data = json.load(f)
+
+    tmp_path = out_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany(
+            "INSERT INTO calibers (name, info) VALUES (?, ?)",
+            ((cal, json.dumps({k: v for k, v in cal_data.items() if k != "projectiles"}, ensure_ascii=False))
+             for cal, cal_data in data.get("calibers", {}).items())
+        )
+        conn.executemany(
+            "INSERT INTO powders (name, info) VALUES (?, ?)",
+            ((name, json.dumps(meta, ensure_ascii=False)) for name, meta in data.get("powders_metadata", {}).items())
+        )
+        conn.executemany(LOAD_INSERT, iter_load_rows(data))
+        write_meta(conn, source_mtime)
+        conn.commit()
+        count = conn.execute("SELECT COUNT(*) FROM loads").fetchone()[0]
+        # Compact file, no WAL: the result is opened read-only/immutable
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, out_path)
+    return out_path, count
+
+
+# --- Streaming JSON export ---
+# Emits exactly what json.dump(data, f, indent=2) produces, one load at a time.
+
+def _dump(value, depth):
+    """json.dumps(value, indent=2) re-indented to sit at the given nesting depth."""
+    return json.dumps(value, indent=2).replace("\n", "\n" + "  " * depth)
+
+
+def _key(name, depth, first):
+    return ("" if first else ",") + "\n" + "  " * depth + json.dumps(name) + ": "
+
+
+def _close(depth, empty):
+    return "}" if empty else "\n" + "  " * depth + "}"
+
+
+def _load_leaf(lo, hi, unit, velocity, note):
+    leaf = {"min": lo, "max": hi, "unit": unit, "velocity": velocity, "note": note}
+    return {k: v for k, v in leaf.items() if v is not None}
+
+
+def export_json(conn, json_path):
+    """
+    Streams the catalog in `conn` back into json_path (via temp file +
+    rename). Loads come from a single cursor ordered by caliber, projectile
+    and original insertion order, so memory does not grow with table size.
+    Returns the new file's mtime_ns.
+    """
+    rows = conn.execute("""
+        SELECT l.caliber, l.projectile, l.powder, l.min, l.max, l.unit, l.velocity, l.note,
+               MIN(l.seq) OVER (PARTITION BY l.caliber, l.projectile) AS proj_seq
+        FROM loads l JOIN calibers c ON c.name = l.caliber
+        ORDER BY c.rowid, proj_seq, l.seq
+    """)
+    row = next(rows, None)
+
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write("{" + _key("calibers", 1, True) + "{")
+        no_calibers = True
+        for cal, info in conn.execute("SELECT name, info FROM calibers ORDER BY rowid"):
+            f.write(_key(cal, 2, no_calibers) + "{" + _key("projectiles", 3, True) + "{")
+            no_calibers = False
+            no_projectiles = True
+            while row is not None and row[0] == cal:
+                proj = row[1]
+                f.write(_key(proj, 4, no_projectiles) + "{" + _key("powders", 5, True) + "{")
+                no_projectiles = False
+                no_powders = True
+                while row is not None and row[0] == cal and row[1] == proj:
+                    f.write(_key(row[2], 6, no_powders) + _dump(_load_leaf(*row[3:8]), 6))
+                    no_powders = False
+                    row = next(rows, None)
+                f.write(_close(5, no_powders) + _close(4, False))
+            f.write(_close(3, no_projectiles))
+            for k, v in json.loads(info).items():
+                f.write(_key(k, 3, False) + _dump(v, 3))
+            f.write(_close(2, False))
+        f.write(_close(1, no_calibers))
+
+        f.write(_key("powders_metadata", 1, False) + "{")
+        no_powders = True
+        for name, info in conn.execute("SELECT name, info FROM powders ORDER BY rowid"):
+            f.write(_key(name, 2, no_powders) + _dump(json.loads(info), 2))
+            no_powders = False
+        f.write(_close(1, no_powders) + _close(0, False))
+    os.replace(tmp_path, json_path)
+    return os.stat(json_path).st_mtime_ns
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compila database.json em um catálogo SQLite somente leitura.")
+    parser.add_argument("json_path", nargs="?", default=CATALOG_FILE)
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args()
+
+    path, count = compile_catalog(args.json_path, args.output)
+    print(f"{count} cargas compiladas em {path}")
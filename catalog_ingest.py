@@ -0,0 +1,202 @@
+"""
+Streaming bulk ingestion of manufacturer load tables into the catalog.
+
+Reads CSV or JSONL in fixed-size chunks, validates each row, dedupes against
+the existing (caliber, projectile, powder) keys and merges into a working
+copy of the compiled catalog. database.json is then rewritten from that
+copy with a streaming export, so neither the input table nor the merged
+catalog is ever held in memory as a whole.
+
+Expected columns / keys:
+    caliber, projectile, powder, min, max [, unit] [, velocity] [, note]
+unit defaults to grains; "g" values are converted to grains.
+
+Usage:
+    python catalog_ingest.py tabela.csv [--format csv|jsonl] [--chunk-size 5000]
+                             [--replace] [--dry-run] [--note "Ref: Tabela CBC"]
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import sys
+from itertools import islice
+
+from catalog import CATALOG_FILE, compiled_is_fresh, compiled_path_for, parse_projectile_weight
+from catalog_compile import LOAD_INSERT, compile_catalog, export_json, write_meta
+
+GRAINS_PER_GRAM = 15.4324
+UNITS = {"grains": 1.0, "grain": 1.0, "gr": 1.0, "g": GRAINS_PER_GRAM}
+VELOCITY_RANGE = (100, 5000)  # fps, anything outside is a typo or a unit mix-up
+MAX_CHARGE_GRAINS = 200.0
+
+
+class RowError(ValueError):
+    pass
+
+
+def iter_table(path, fmt=None):
+    """Yields (line_number, dict) from a CSV or JSONL file without loading it."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield line_no, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield line_no, RowError(f"JSON inválido: {e}")
+
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _number(value, field, required=True):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise RowError(f"'{field}' ausente")
+        return None
+    try:
+        return float(str(value).strip().replace(",", "."))
+    except ValueError:
+        raise RowError(f"'{field}' não numérico: {value!r}")
+
+
+def _text(value, field):
+    value = (value or "").strip() if isinstance(value, str) or value is None else str(value).strip()
+    if not value:
+        raise RowError(f"'{field}' ausente")
+    return value
+
+
+def validate_row(row, default_note=None):
+    """
+    Normalizes one input row into a (caliber, projectile, powder, min, max,
+    unit, velocity, note) tuple in grains, or raises RowError.
+    """
+    if isinstance(row, Exception):
+        raise row
+    caliber = _text(row.get("caliber"), "caliber")
+    projectile = _text(row.get("projectile"), "projectile")
+    powder = _text(row.get("powder"), "powder")
+
+    unit = (row.get("unit") or "grains").strip().lower()
+    if unit not in UNITS:
+        raise RowError(f"unidade desconhecida: {unit!r}")
+    factor = UNITS[unit]
+    lo = _number(row.get("min"), "min") * factor
+    hi = _number(row.get("max"), "max") * factor
+    if lo <= 0 or hi <= 0:
+        raise RowError("carga deve ser positiva")
+    if lo > hi:
+        raise RowError(f"min ({lo}) maior que max ({hi})")
+    if hi > MAX_CHARGE_GRAINS:
+        raise RowError(f"carga máxima fora da faixa: {hi} grains")
+
+    velocity = _number(row.get("velocity"), "velocity", required=False)
+    if velocity is not None:
+        if not VELOCITY_RANGE[0] <= velocity <= VELOCITY_RANGE[1]:
+            raise RowError(f"velocidade fora da faixa: {velocity} fps")
+        velocity = int(velocity) if velocity.is_integer() else velocity
+
+    note = (row.get("note") or "").strip() or default_note
+    return caliber, projectile, powder, round(lo, 2), round(hi, 2), "grains", velocity, note
+
+
+def ingest(paths, json_path=CATALOG_FILE, fmt=None, chunk_size=5000, replace=False, dry_run=False,
+           default_note=None, max_errors=50, log=print):
+    """
+    Merges the given tables into the catalog. Returns a stats dict with
+    read / inserted / updated / duplicates / invalid counts.
+    """
+    compiled = compiled_path_for(json_path)
+    if not compiled_is_fresh(compiled, os.stat(json_path).st_mtime_ns):
+        compile_catalog(json_path, compiled)
+
+    # Work on a copy: the app keeps the compiled file open as immutable
+    work_path = compiled + ".ingest"
+    shutil.copyfile(compiled, work_path)
+    stats = {"read": 0, "inserted": 0, "updated": 0, "duplicates": 0, "invalid": 0}
+
+    conn = sqlite3.connect(work_path)
+    try:
+        seq = conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM loads").fetchone()[0]
+        for path in paths:
+            for chunk in chunked(iter_table(path, fmt), chunk_size):
+                rows = []
+                for line_no, raw in chunk:
+                    stats["read"] += 1
+                    try:
+                        rows.append(validate_row(raw, default_note))
+                    except RowError as e:
+                        stats["invalid"] += 1
+                        if stats["invalid"] <= max_errors:
+                            log(f"{path}:{line_no}: {e}")
+
+                for row in rows:
+                    cal, proj, powder = row[:3]
+                    conn.execute("INSERT OR IGNORE INTO calibers (name, info) VALUES (?, '{}')", (cal,))
+                    exists = conn.execute(
+                        "SELECT 1 FROM loads WHERE caliber = ? AND projectile = ? AND powder = ?", (cal, proj, powder)
+                    ).fetchone()
+                    if not exists:
+                        conn.execute(LOAD_INSERT, row + (parse_projectile_weight(proj), seq))
+                        seq += 1
+                        stats["inserted"] += 1
+                    elif replace:
+                        conn.execute(
+                            "UPDATE loads SET min = ?, max = ?, unit = ?, velocity = ?, note = ? "
+                            "WHERE caliber = ? AND projectile = ? AND powder = ?",
+                            row[3:] + (cal, proj, powder)
+                        )
+                        stats["updated"] += 1
+                    else:
+                        stats["duplicates"] += 1
+                # One transaction per chunk keeps the journal (and memory) bounded
+                conn.commit()
+
+        if not dry_run and (stats["inserted"] or stats["updated"]):
+            source_mtime = export_json(conn, json_path)
+            write_meta(conn, source_mtime)
+            conn.commit()
+    finally:
+        conn.close()
+
+    if not dry_run and (stats["inserted"] or stats["updated"]):
+        os.replace(work_path, compiled)
+    else:
+        os.remove(work_path)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa tabelas de carga (CSV/JSONL) para o catálogo.")
+    parser.add_argument("tables", nargs="+")
+    parser.add_argument("--catalog", default=CATALOG_FILE)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--replace", action="store_true", help="Sobrescreve cargas já existentes")
+    parser.add_argument("--dry-run", action="store_true", help="Valida sem gravar")
+    parser.add_argument("--note", default=None, help="Nota padrão para linhas sem 'note'")
+    args = parser.parse_args()
+
+    result = ingest(
+        args.tables, json_path=args.catalog, fmt=args.format, chunk_size=args.chunk_size,
+        replace=args.replace, dry_run=args.dry_run, default_note=args.note,
+        log=lambda msg: print(msg, file=sys.stderr),
+    )
+    print(
+        f"Lidas: {result['read']} | Inseridas: {result['inserted']} | Atualizadas: {result['updated']} | "
+        f"Duplicadas: {result['duplicates']} | Inválidas: {result['invalid']}"
+    )
@@ -0,0 +1,101 @@
+"""
+Normalized component keys for stock items and reload-session components.
+
+normalize_component() turns a typed name into a canonical key: accents
+stripped, case-folded, punctuation dropped, unit spellings and CBC
+nomenclature mapped to common tokens, tokens sorted. Lookups then become
+exact equality on an indexed key column, which is both faster and
+stricter than the old wildcard ILIKE ("CBC 216" no longer matches
+"CBC 2160"):
+
+    "CBC 216"           -> "216 cbc"
+    "cbc-216"           -> "216 cbc"
+    "124 grains ETOG"   -> "124gr fmj"
+    "Small Pistol CBC"  -> "cbc pistol small"
+
+Names that differ beyond that (brand omitted, abbreviations) go through a
+small in-memory alias table consulted by lookup_keys().
+"""
+import re
+import threading
+import unicodedata
+
+_TOKEN_RE = re.compile(r"\+?[a-z0-9]+(?:[.,]\d+)?")
+_WEIGHT_RE = re.compile(r"^(\d+(?:\.\d+)?)(?:gr|grs|grain|grains)$")
+
+# Spelling variants -> canonical token
+TOKEN_ALIASES = {
+    "grain": "gr", "grains": "gr", "grs": "gr",
+    "pistola": "pistol", "fuzil": "rifle",
+    "pequena": "small", "grande": "large",
+    # CBC projectile nomenclature
+    "etog": "fmj",  # encamisado total ogival
+    "expo": "jhp",  # expansivo ponta oca
+    "chog": "lrn",  # chumbo ogival
+}
+
+# Leading brand tokens a user may leave out ("216" for "CBC 216")
+BRAND_TOKENS = frozenset({"cbc", "magtech", "hodgdon", "imr", "alliant", "vihtavuori", "winchester",
+                          "accurate", "ramshot", "fiocchi", "cci", "federal", "remington", "sellier", "bellot"})
+
+# Alternate key -> canonical key (both already normalized)
+_aliases = {
+    "sp": "pistol small",
+    "spm": "magnum pistol small",
+    "lp": "large pistol",
+    "sr": "rifle small",
+    "lr": "large rifle",
+}
+_aliases_lock = threading.Lock()
+
+
+def normalize_component(name):
+    """Canonical key for a component name; "" for empty names."""
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    tokens = [TOKEN_ALIASES.get(t, t) for t in _TOKEN_RE.findall(text)]
+
+    # "124 gr" / "124grains" -> "124gr" so weights compare as one token
+    merged = []
+    for tok in tokens:
+        tok = tok.replace(",", ".")
+        if tok == "gr" and merged and merged[-1].replace(".", "").isdigit():
+            merged[-1] += "gr"
+        else:
+            merged.append(_WEIGHT_RE.sub(r"\1gr", tok))
+    return " ".join(sorted(merged))
+
+
+def register_alias(alias, canonical):
+    """Makes names normalizing to `alias` resolve to `canonical`'s key."""
+    alias_key, canonical_key = normalize_component(alias), normalize_component(canonical)
+    if alias_key and canonical_key and alias_key != canonical_key:
+        with _aliases_lock:
+            _aliases.setdefault(alias_key, canonical_key)
+
+
+def strip_brand(key):
+    """A normalized key without its brand tokens ("216 cbc" -> "216"); the key itself if nothing else is left."""
+    brandless = [t for t in key.split() if t not in BRAND_TOKENS]
+    return " ".join(brandless) if brandless else key
+
+
+def register_brand_aliases(names):
+    """Registers the brand-less form of each name ("216" -> "CBC 216"), e.g. for catalog powders."""
+    for name in names:
+        key = normalize_component(name)
+        brandless = strip_brand(key)
+        if brandless != key:
+            with _aliases_lock:
+                _aliases.setdefault(brandless, key)
+
+
+def lookup_keys(name):
+    """Keys to try for a typed name, in preference order: its own key, then its alias."""
+    key = normalize_component(name)
+    if not key:
+        return []
+    alias = _aliases.get(key)
+    return [key, alias] if alias and alias != key else [key]
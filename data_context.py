@@ -0,0 +1,57 @@
+"""
+Per-rerun unit of work for the Streamlit app.
+
+Every script run used to open a Session per section and fetch the User
+again in each one. DataContext opens one Session for the whole run, loads
+the User once and eager-loads its collections only when a tab asks for
+them; every tab then shares the same objects through the identity map.
+"""
+from sqlalchemy.orm import selectinload
+
+from models import User, get_session
+
+LOADABLE = ("firearms", "sessions", "inventory", "custom_loads")
+
+
+class DataContext:
+    def __init__(self, user_id, session_factory=get_session):
+        self.user_id = user_id
+        self.session = session_factory()
+        self._user = None
+        self._loaded = set()
+
+    @property
+    def user(self):
+        """The logged-in User, fetched on first use."""
+        if self._user is None:
+            self._user = self.session.get(User, self.user_id)
+        return self._user
+
+    def load(self, *relationships):
+        """
+        Makes sure the named User collections are loaded, with one
+        selectinload query each, and returns the User. Collections already
+        loaded in this run (and not expired by a commit) are not queried again.
+        """
+        user = self.user
+        missing = [
+            name for name in relationships
+            if name not in self._loaded or name not in user.__dict__
+        ]
+        if missing:
+            unknown = set(missing) - set(LOADABLE)
+            if unknown:
+                raise ValueError(f"Unknown User relationship(s): {', '.join(sorted(unknown))}")
+            self.session.query(User).options(
+                *(selectinload(getattr(User, name)) for name in missing)
+            ).filter(User.id == self.user_id).all()
+            self._loaded.update(missing)
+        return user
+
+    def commit(self):
+        self.session.commit()
+
+    def close(self):
+        self.session.close()
+        self._user = None
+        self._loaded.clear()
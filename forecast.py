@@ -0,0 +1,111 @@
+"""
+Consumption rates and run-out forecasts per stock item.
+
+ComponentUsage keeps one row per item and day, upserted by
+consume_for_sessions() on every session save, so a forecast never rescans
+the logbook. It reads the last RATE_WINDOW_DAYS of those rows with one
+indexed range query and lays them out as an items x days matrix; each
+row's sum over the full window length is the item's daily rate, and its
+run-out date is stock / rate days from today. Only items with usage in
+the window are loaded for alerts, so a dashboard rerun costs one small
+query when nothing is being used.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import ComponentUsage, InventoryItem
+
+RATE_WINDOW_DAYS = 30
+# Alert when an item is forecast to run out within this many days
+REORDER_LEAD_DAYS = 30
+# ...and only once it was used on this many days in the window, so a single reload day never alerts
+MIN_USAGE_DAYS = 2
+
+# daily_rate in the item's base unit; days_left/runs_out are None when the item is not being used
+# usage_days: days with consumption inside the rate window
+Forecast = namedtuple("Forecast", "item_id category name unit display_unit quantity daily_rate usage_days days_left runs_out")
+
+
+def record_usage(db_session, user_id, usage):
+    """Adds {(item_id, day): quantity} to the daily usage rows (one upsert)."""
+    rows = [
+        {"user_id": user_id, "item_id": item_id, "day": day, "quantity": quantity}
+        for (item_id, day), quantity in usage.items() if quantity
+    ]
+    if not rows:
+        return
+    table = ComponentUsage.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.item_id, table.c.day],
+        set_={"quantity": table.c.quantity + stmt.excluded.quantity},
+    )
+    db_session.execute(stmt, rows)
+
+
+def usage_day(value):
+    """Calendar day of a session date (date or datetime)."""
+    return value.date() if isinstance(value, datetime) else value
+
+
+def forecast_stock(db_session, user_id, today=None, used_only=False):
+    """
+    Forecast for every stock item (or, with used_only, only those used in
+    the rate window), soonest run-out first; items not in use never run out.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=RATE_WINDOW_DAYS - 1)
+
+    rows = db_session.query(ComponentUsage.item_id, ComponentUsage.day, ComponentUsage.quantity).filter(
+        ComponentUsage.user_id == user_id, ComponentUsage.day >= start, ComponentUsage.day <= today
+    ).all()
+    if used_only and not rows:
+        return []
+
+    query = db_session.query(
+        InventoryItem.id, InventoryItem.category, InventoryItem.name, InventoryItem.unit,
+        InventoryItem.display_unit, InventoryItem.quantity,
+    ).filter(InventoryItem.user_id == user_id)
+    if used_only:
+        query = query.filter(InventoryItem.id.in_({item_id for item_id, _, _ in rows}))
+    items = query.order_by(InventoryItem.id).all()
+    if not items:
+        return []
+    row_of = {item.id: row for row, item in enumerate(items)}
+
+    usage = np.zeros((len(items), RATE_WINDOW_DAYS))
+    hits = [(row_of[item_id], (day - start).days, quantity) for item_id, day, quantity in rows if item_id in row_of]
+    if hits:
+        r, d, amounts = zip(*hits)
+        np.add.at(usage, (np.array(r), np.array(d)), np.array(amounts))
+
+    # Always the full window: averaging a new item over only the days since its first
+    # use would turn one reload day into a whole day's rate and a run-out in days
+    rates = usage.sum(axis=1) / RATE_WINDOW_DAYS
+    usage_days = (usage > 0).sum(axis=1)
+
+    quantities = np.array([max(item.quantity or 0.0, 0.0) for item in items])
+    days_left = np.divide(quantities, rates, out=np.full_like(rates, np.inf), where=rates > 0)
+
+    result = []
+    for row, item in enumerate(items):
+        left = float(days_left[row])
+        finite = np.isfinite(left)
+        result.append(Forecast(
+            item.id, item.category, item.name, item.unit, item.display_unit or item.unit,
+            float(quantities[row]), float(rates[row]), int(usage_days[row]),
+            left if finite else None,
+            today + timedelta(days=int(left)) if finite else None,
+        ))
+    return sorted(result, key=lambda f: (f.days_left is None, f.days_left or 0, f.name))
+
+
+def reorder_alerts(db_session, user_id, lead_days=REORDER_LEAD_DAYS, today=None):
+    """Forecasts of items used on MIN_USAGE_DAYS or more days that run out within lead_days at the current rate."""
+    return [
+        f for f in forecast_stock(db_session, user_id, today, used_only=True)
+        if f.days_left is not None and f.days_left <= lead_days and f.usage_days >= MIN_USAGE_DAYS
+    ]
@@ -0,0 +1,327 @@
+"""
+Stock consumption and cost per round for reload sessions.
+
+Resolves every component a batch of sessions uses (powder, projectile,
+primer, case) with one query on the indexed (user_id, category, name_key)
+columns, matching components.lookup_keys() exactly, and applies all
+decrements as a single relative UPDATE in the caller's transaction:
+quantity = quantity - amount is computed by SQLite under its write lock, so
+concurrent saves from several devices never overwrite each other's
+deductions. The caller commits (or rolls back the session and the stock
+together).
+
+Every purchase is a StockLot; consumption draws the oldest lots first
+(FIFO) and freezes the session's cost_per_round from what it actually drew,
+so later purchases at other prices never rewrite past sessions' costs.
+InventoryItem.price_unit stays the average of what is left, for display.
+
+Quantities are in base units (units.py): charge x rounds is already grains,
+so powder is deducted without any per-row conversion.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, func, update
+
+import stock_ledger
+from components import lookup_keys
+from forecast import record_usage, usage_day
+from models import InventoryItem, ReloadSession, StockLot, adjust_user_stats, bump_data_version
+from units import category_unit, to_base
+
+# Stock category -> ReloadSession attribute holding the component name
+COMPONENT_FIELDS = (
+    ("Pólvora", "powder"),
+    ("Projétil", "projectile"),
+    ("Espoleta", "primer"),
+    ("Estojo", "case"),
+)
+
+ComponentUse = namedtuple("ComponentUse", "category requested item_id item_name amount unit remaining")
+ConsumptionResult = namedtuple("ConsumptionResult", "consumed missing")
+
+
+def find_stock_item(db_session, user_id, category, name):
+    """The user's stock item for a typed component name (exact key or alias), or None."""
+    keys = lookup_keys(name)
+    if not keys:
+        return None
+    items = (
+        db_session.query(InventoryItem)
+        .filter(InventoryItem.user_id == user_id, InventoryItem.category == category, InventoryItem.name_key.in_(keys))
+        .order_by(InventoryItem.id)
+        .all()
+    )
+    by_key = {}
+    for item in items:
+        by_key.setdefault(item.name_key, item)
+    return next((by_key[k] for k in keys if k in by_key), None)
+
+
+# --- Cost per round ---
+# Frozen on ReloadSession.cost_per_round when the session consumes stock
+# (FIFO lots, consume_for_sessions). Sessions saved before lots existed are
+# costed once from a price map of current average prices.
+
+def load_price_map(db_session, user_id):
+    """{(category, name_key): price per base unit} for the user's whole stock."""
+    prices = {}
+    for category, name_key, price_unit in (
+        db_session.query(InventoryItem.category, InventoryItem.name_key, InventoryItem.price_unit)
+        .filter(InventoryItem.user_id == user_id)
+        .order_by(InventoryItem.id)
+    ):
+        prices.setdefault((category, name_key), price_unit or 0.0)
+    return prices
+
+
+def _price(prices, category, key):
+    for k in lookup_keys(key):
+        if (category, k) in prices:
+            return prices[(category, k)]
+    return None
+
+
+def cost_per_round(prices, charge, powder_key, projectile_key, primer_key, case_key):
+    """Component cost of one round at average prices; components missing from stock count as zero."""
+    total = (charge or 0) * (_price(prices, "Pólvora", powder_key) or 0) # R$/grain
+    for category, key in (("Projétil", projectile_key), ("Espoleta", primer_key), ("Estojo", case_key)):
+        total += _price(prices, category, key) or 0
+    return round(total, 4)
+
+
+def backfill_session_costs(db_session, user_id):
+    """
+    Costs the user's sessions that have no cost_per_round yet, at current
+    average prices: one SELECT for prices, one for sessions, one batched
+    UPDATE. Returns the number of rows updated.
+    """
+    rs = ReloadSession
+    rows = db_session.query(
+        rs.id, rs.charge, rs.powder_key, rs.projectile_key, rs.primer_key, rs.case_key
+    ).filter(rs.user_id == user_id, rs.cost_per_round.is_(None)).all()
+    if not rows:
+        return 0
+
+    prices = load_price_map(db_session, user_id)
+    changes = [{"row_id": row.id, "cost": cost_per_round(prices, *row[1:])} for row in rows]
+    table = rs.__table__
+    db_session.execute(
+        table.update().where(table.c.id == bindparam("row_id")).values(cost_per_round=bindparam("cost")),
+        changes
+    )
+    # Keep already-loaded sessions in this Session consistent with the bulk UPDATE
+    for obj in list(db_session.identity_map.values()):
+        if isinstance(obj, rs) and obj.user_id == user_id:
+            db_session.expire(obj, ["cost_per_round"])
+    return len(changes)
+
+
+# --- FIFO lots ---
+
+def _open_lots(db_session, item_ids):
+    """
+    {item_id: [[lot_id, remaining, unit_cost, remaining_before], ...]}, oldest
+    first, lots with stock left only.
+    """
+    lots = {}
+    for lot_id, item_id, remaining, unit_cost in (
+        db_session.query(StockLot.id, StockLot.item_id, StockLot.remaining, StockLot.unit_cost)
+        .filter(StockLot.item_id.in_(item_ids), StockLot.remaining > 0)
+        .order_by(StockLot.item_id, StockLot.purchased_at, StockLot.id)
+    ):
+        lots.setdefault(item_id, []).append([lot_id, remaining, unit_cost, remaining])
+    return lots
+
+
+def _take_fifo(lots, amount, fallback_cost):
+    """
+    Draws amount from the oldest lots (mutating them); returns its cost.
+    Whatever the lots cannot cover (stock going negative) is costed at
+    fallback_cost, the item's current average.
+    """
+    cost = 0.0
+    for lot in lots:
+        if amount <= 0:
+            break
+        take = min(lot[1], amount)
+        lot[1] -= take
+        amount -= take
+        cost += take * lot[2]
+    return cost + max(amount, 0) * fallback_cost
+
+
+def consume_for_sessions(db_session, user_id, reload_sessions):
+    """
+    Deducts the components used by reload_sessions (already added to
+    db_session) from the user's stock, oldest lots first, and freezes each
+    session's cost_per_round from the lots it drew. Returns a
+    ConsumptionResult with one ComponentUse per stock item touched and the
+    (category, name) pairs that matched no stock item.
+    """
+    # Components per session in base units: powder in grains, the rest in rounds
+    needs = []
+    for rs in reload_sessions:
+        rounds = rs.quantity or 0
+        for category, field in COMPONENT_FIELDS:
+            name = (getattr(rs, field) or "").strip()
+            if name:
+                amount = (rs.charge or 0) * rounds if category == "Pólvora" else rounds
+                needs.append((rs, category, name, amount))
+    if not needs:
+        for rs in reload_sessions:
+            rs.cost_per_round = 0.0
+        return ConsumptionResult([], [])
+
+    # Flush first so this transaction holds SQLite's write lock before reading
+    # stock and lots; a concurrent save then waits (busy_timeout) instead of racing.
+    db_session.flush()
+    lookups = {(category, name): lookup_keys(name) for _, category, name, _ in needs}
+    wanted = {(category, key) for (category, _), keys in lookups.items() for key in keys}
+    found = {}
+    # category IN x name_key IN seeks the (user_id, category, name_key) index
+    # for every pair; the few cross pairs nobody asked for are dropped here
+    for item in (
+        db_session.query(InventoryItem)
+        .filter(
+            InventoryItem.user_id == user_id,
+            InventoryItem.category.in_({c for c, _ in wanted}),
+            InventoryItem.name_key.in_({k for _, k in wanted}),
+        )
+        .order_by(InventoryItem.id)
+    ):
+        # Legacy items kept in another unit (grams of primers) cannot be drawn from
+        if (item.category, item.name_key) in wanted and item.unit == category_unit(item.category):
+            found.setdefault((item.category, item.name_key), item)
+    resolved = {
+        pair: next((found[(pair[0], k)] for k in keys if (pair[0], k) in found), None)
+        for pair, keys in lookups.items()
+    }
+    lots = _open_lots(db_session, {item.id for item in resolved.values() if item is not None})
+
+    # Sessions draw in the order given, so a ladder's first step gets the oldest lot
+    uses = {}
+    movements = []
+    session_costs = {}
+    daily = {}
+    for rs, category, name, amount in needs:
+        item = resolved[(category, name)]
+        if item is None:
+            continue
+        cost = _take_fifo(lots.get(item.id, []), amount, item.price_unit or 0)
+        prev = uses.get(item.id, (item, 0, 0, name))
+        uses[item.id] = (item, prev[1] + amount, prev[2] + cost, prev[3])
+        session_costs[rs] = session_costs.get(rs, 0) + cost
+        day_key = (item.id, usage_day(rs.date))
+        daily[day_key] = daily.get(day_key, 0) + amount
+        movements.append(stock_ledger.movement(
+            item, stock_ledger.CONSUMPTION, -amount, -cost, reload_session_id=rs.id
+        ))
+    for rs in reload_sessions:
+        rounds = rs.quantity or 0
+        rs.cost_per_round = round(session_costs.get(rs, 0) / rounds, 4) if rounds else 0.0
+
+    missing = sorted({pair for pair, item in resolved.items() if item is None})
+    if not uses:
+        return ConsumptionResult([], missing)
+
+    # The average price follows what is left in the lots: (value - cost) / (quantity - amount),
+    # computed by SQLite from the row's own values like the quantity itself
+    deltas = {item_id: amount for item_id, (_, amount, _, _) in uses.items()}
+    costs = {item_id: cost for item_id, (_, _, cost, _) in uses.items()}
+    amount = case(deltas, value=InventoryItem.id, else_=0)
+    left = InventoryItem.quantity - amount
+    remaining = dict(db_session.execute(
+        update(InventoryItem)
+        .where(InventoryItem.id.in_(deltas))
+        .values(
+            quantity=left,
+            price_unit=case(
+                (left > 0, (InventoryItem.quantity * func.coalesce(InventoryItem.price_unit, 0)
+                            - case(costs, value=InventoryItem.id, else_=0)) / left),
+                else_=InventoryItem.price_unit,
+            ),
+        )
+        .returning(InventoryItem.id, InventoryItem.quantity),
+        execution_options={"synchronize_session": "fetch"},
+    ).all())
+    drawn = [{"lot_id": lot[0], "left": lot[1]}
+             for item_lots in lots.values() for lot in item_lots if lot[1] != lot[3]]
+    if drawn:
+        lot_table = StockLot.__table__
+        db_session.execute(
+            lot_table.update().where(lot_table.c.id == bindparam("lot_id")).values(remaining=bindparam("left")),
+            drawn
+        )
+    bump_data_version(db_session, [user_id])
+    adjust_user_stats(db_session, user_id, total_investment=-sum(cost for _, _, cost, _ in uses.values()))
+    stock_ledger.record_movements(db_session, movements)
+    record_usage(db_session, user_id, daily)
+
+    consumed = [
+        ComponentUse(item.category, requested, item.id, item.name, amount, item.unit, remaining.get(item.id))
+        for item_id, (item, amount, cost, requested) in uses.items()
+    ]
+    return ConsumptionResult(consumed, missing)
+
+
+def receive_stock(db_session, user_id, category, name, quantity, unit, paid):
+    """
+    Adds a purchase of `quantity` `unit` to stock: merges into the matching
+    item (weighted average price) or creates it, opens a lot for it and
+    records the purchase in the ledger. Returns (item, created).
+    Raises ValueError if `quantity` is not positive, if `unit` cannot be
+    converted to the category's base unit (e.g. grams of primers, units of
+    powder), or if the matching item is a legacy one kept in another unit.
+    """
+    # A zero purchase would book `paid` in the ledger without adding any stock
+    if not quantity or quantity <= 0:
+        raise ValueError("Informe uma quantidade maior que zero.")
+    quantity = to_base(quantity, unit, category)
+    item = find_stock_item(db_session, user_id, category, name)
+    created = item is None
+    if not created and item.unit != category_unit(category):
+        raise ValueError(f"{item.name} está registrado em {item.unit}; remova o item e cadastre-o "
+                         f"novamente em {category_unit(category)}.")
+    if created:
+        item = InventoryItem(user_id=user_id, category=category, name=name, quantity=quantity,
+                             unit=category_unit(category), display_unit=unit,
+                             price_unit=paid / quantity)
+        db_session.add(item)
+        db_session.flush() # item.id for the ledger
+    movements = [stock_ledger.movement(item, stock_ledger.PURCHASE, quantity, paid)]
+    remaining = quantity
+    if not created:
+        total_qty = item.quantity + quantity
+        if item.quantity < 0:
+            # Overdrawn: the shortfall comes out of this lot, and what is left is all this
+            # lot, so the item takes its cost. The shortfall was consumed at the old average;
+            # an adjustment carries the difference so the ledger value matches the item.
+            old_value = item.quantity * (item.price_unit or 0)
+            remaining = max(total_qty, 0)
+            item.price_unit = paid / quantity
+            true_up = total_qty * item.price_unit - (old_value + paid)
+            if true_up:
+                movements.append(stock_ledger.movement(item, stock_ledger.ADJUSTMENT, 0, true_up))
+        elif total_qty > 0:
+            # Update average price
+            item.price_unit = ((item.quantity * item.price_unit) + paid) / total_qty
+        item.quantity = total_qty
+    db_session.add(StockLot(user_id=user_id, item_id=item.id, purchased_at=datetime.now(),
+                            quantity=quantity, remaining=remaining, unit_cost=paid / quantity))
+    stock_ledger.record_movements(db_session, movements)
+    return item, created
+
+
+def remove_stock_item(db_session, item):
+    """Deletes an item with its lots, closing its ledger balance with an adjustment to zero."""
+    db_session.query(StockLot).filter(StockLot.item_id == item.id).delete(synchronize_session=False)
+    stock_ledger.record_movements(db_session, [stock_ledger.movement(
+        item, stock_ledger.ADJUSTMENT, -item.quantity, -item.quantity * (item.price_unit or 0)
+    )])
+    db_session.delete(item)
+
+
+def consume_for_session(db_session, reload_session):
+    """consume_for_sessions() for a single, newly added ReloadSession."""
+    return consume_for_sessions(db_session, reload_session.user_id, [reload_session])
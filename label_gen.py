@@ -1,16 +1,18 @@
 from reportlab.lib import colors
-from reportlab.lib.pagesizes import mm
+from reportlab.lib.pagesizes import A4, mm
 from reportlab.pdfgen import canvas
 from io import BytesIO
+from collections import OrderedDict
+import threading
 
-def create_label_pdf(session, user_name):
+LABEL_WIDTH, LABEL_HEIGHT = 100 * mm, 60 * mm
+
+def draw_label(c, session, user_name):
     """
-    Generates a PDF label for ammo box.
+    Draws one ammo box label at the canvas origin.
     Dimensions: 100mm x 60mm (Standard large label)
     """
-    width, height = 100 * mm, 60 * mm
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=(width, height))
+    width, height = LABEL_WIDTH, LABEL_HEIGHT
     
     # Border
     c.setLineWidth(1)
@@ -51,7 +53,97 @@ def create_label_pdf(session, user_name):
     c.setFont("Helvetica", 6)
     c.drawRightString(width - 4*mm, 4*mm, f"Op: {user_name}")
 
-    c.showPage()
+def create_label_pdf(session, user_name):
+    """Generates a single-label PDF (100mm x 60mm) for an ammo box."""
+    return create_labels_pdf([session], user_name)
+
+# Process-wide LRU of rendered single labels, keyed by session id + content
+LABEL_CACHE_SIZE = 512
+_label_cache = OrderedDict()
+_label_cache_lock = threading.Lock()
+
+def label_version(session, user_name):
+    """Everything draw_label prints; any edit yields a new cache key."""
+    return (
+        session.date, session.caliber, session.projectile, session.powder, session.charge,
+        session.quantity, session.primer, session.case, session.velocity_avg, session.notes, user_name,
+    )
+
+def get_label_pdf(session, user_name):
+    """
+    Label PDF bytes for a session, rendered on first request only and
+    served from the LRU cache while the label content is unchanged.
+    """
+    key = (session.id, label_version(session, user_name))
+    with _label_cache_lock:
+        data = _label_cache.get(key)
+        if data is not None:
+            _label_cache.move_to_end(key)
+            return data
+
+    data = create_label_pdf(session, user_name).getvalue()
+    with _label_cache_lock:
+        _label_cache[key] = data
+        _label_cache.move_to_end(key)
+        while len(_label_cache) > LABEL_CACHE_SIZE:
+            _label_cache.popitem(last=False)
+    return data
+
+def create_labels_pdf(sessions, user_name):
+    """
+    Generates one PDF with a 100mm x 60mm page per session, in a single
+    canvas pass (e.g. every step of a load ladder).
+    """
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(LABEL_WIDTH, LABEL_HEIGHT))
+    for session in sessions:
+        draw_label(c, session, user_name)
+        c.showPage()
     c.save()
     buffer.seek(0)
     return buffer
+
+# Label stock for multi-up A4 sheets (all dimensions in mm)
+LABEL_SHEETS = {
+    "A4 - 2x4 (100x60mm)": {"cols": 2, "rows": 4, "width": 100, "height": 60, "left": 5, "top": 28.5, "gap_x": 0, "gap_y": 0},
+    "A4 - 2x5 (99,1x57mm)": {"cols": 2, "rows": 5, "width": 99.1, "height": 57, "left": 4.65, "top": 6, "gap_x": 2.5, "gap_y": 0},
+    "A4 - 3x7 (63,5x38,1mm)": {"cols": 3, "rows": 7, "width": 63.5, "height": 38.1, "left": 7.21, "top": 15.15, "gap_x": 2.54, "gap_y": 0},
+}
+DEFAULT_SHEET = "A4 - 2x4 (100x60mm)"
+
+def create_label_sheet_pdf(sessions, user_name, layout=DEFAULT_SHEET, output=None):
+    """
+    Lays out N labels per A4 sheet for standard label stock, in one document
+    build. `sessions` may be any iterable (e.g. a query), consumed lazily;
+    each sheet is closed as soon as it is full. Writes to `output` (path or
+    file object) or returns a BytesIO.
+    """
+    spec = LABEL_SHEETS[layout]
+    out = output if output is not None else BytesIO()
+    c = canvas.Canvas(out, pagesize=A4, pageCompression=1)
+    page_w, page_h = A4
+    per_page = spec["cols"] * spec["rows"]
+    # Uniform scale keeps the 100x60 artwork undistorted, centered in each cell
+    scale = min(spec["width"] * mm / LABEL_WIDTH, spec["height"] * mm / LABEL_HEIGHT)
+    pad_x = (spec["width"] * mm - LABEL_WIDTH * scale) / 2
+    pad_y = (spec["height"] * mm - LABEL_HEIGHT * scale) / 2
+
+    slot = 0
+    for session in sessions:
+        col, row = slot % spec["cols"], (slot // spec["cols"]) % spec["rows"]
+        x = (spec["left"] + col * (spec["width"] + spec["gap_x"])) * mm + pad_x
+        y = page_h - (spec["top"] + (row + 1) * spec["height"] + row * spec["gap_y"]) * mm + pad_y
+        c.saveState()
+        c.translate(x, y)
+        c.scale(scale, scale)
+        draw_label(c, session, user_name)
+        c.restoreState()
+        slot += 1
+        if slot % per_page == 0:
+            c.showPage()
+    if slot == 0 or slot % per_page:
+        c.showPage()
+    c.save()
+    if output is None:
+        out.seek(0)
+    return out
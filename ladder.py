@@ -0,0 +1,52 @@
+"""
+Load ladder (escada de carga): N charge steps between the catalog min and
+max, created as ReloadSession rows in one batch.
+"""
+from datetime import date
+
+import numpy as np
+
+from models import ReloadSession
+
+CHARGE_RESOLUTION = 0.1  # grains; typical powder scale precision
+
+
+def charge_ladder(min_charge, max_charge, steps):
+    """All ladder charges at once, rounded to scale resolution and never above max."""
+    if steps < 2 or max_charge <= min_charge:
+        return [round(float(min_charge), 2)]
+    charges = np.linspace(min_charge, max_charge, int(steps))
+    charges = np.round(charges / CHARGE_RESOLUTION) * CHARGE_RESOLUTION
+    charges = np.minimum(charges, max_charge)
+    # Rounding can collapse neighbouring steps on narrow ranges
+    return [round(float(c), 2) for c in np.unique(charges)]
+
+
+def create_ladder_sessions(session, user_id, caliber, projectile, powder, charges, quantity_per_step,
+                           primer=None, case=None, firearm_id=None, ladder_date=None):
+    """
+    Adds one ReloadSession per ladder step and flushes them together: the
+    ORM batches the rows into a single multi-row INSERT. The caller commits.
+    Returns the new sessions (with ids), in charge order.
+    """
+    ladder_date = ladder_date or date.today()
+    total = len(charges)
+    rows = [
+        ReloadSession(
+            user_id=user_id,
+            firearm_id=firearm_id,
+            date=ladder_date,
+            caliber=caliber,
+            projectile=projectile,
+            powder=powder,
+            charge=charge,
+            primer=primer,
+            case=case,
+            quantity=quantity_per_step,
+            notes=f"Escada de carga {i}/{total}",
+        )
+        for i, charge in enumerate(charges, start=1)
+    ]
+    session.add_all(rows)
+    session.flush()
+    return rows
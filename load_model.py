@@ -0,0 +1,79 @@
+"""
+Charge -> velocity models fitted from the catalog's own velocity data.
+
+Each powder gets an energy coefficient k from every catalog entry that has a
+published velocity, assuming (as in the CBC tables) that the velocity refers
+to the maximum charge:
+
+    v² · w = k · charge        (w = projectile weight in grains)
+
+i.e. muzzle energy proportional to powder mass. k is a least-squares fit
+through the origin, so the charge for a target velocity is v² · w / k and a
+whole grid of powders × velocities is a single NumPy outer product.
+"""
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from catalog import parse_projectile_weight
+
+# rms_pct: fit error over the samples, None for single-sample fits
+PowderModel = namedtuple("PowderModel", "powder k samples rms_pct")
+
+_models_cache = {}
+_models_lock = threading.Lock()
+
+
+def fit_powder_models(catalog):
+    """Fits one PowderModel per powder with usable velocity data."""
+    groups = {}
+    for e in catalog.query():
+        weight = parse_projectile_weight(e.projectile)
+        if not (e.velocity and e.max and weight):
+            continue
+        g = groups.setdefault(e.powder, ([], [], []))
+        g[0].append(e.max)
+        g[1].append(weight)
+        g[2].append(e.velocity)
+
+    models = {}
+    for powder, (charge, weight, velocity) in groups.items():
+        c, w, v = np.asarray(charge, float), np.asarray(weight, float), np.asarray(velocity, float)
+        y = v ** 2 * w
+        k = float(np.dot(c, y) / np.dot(c, c))
+        predicted = np.sqrt(k * c / w)
+        # A one-point fit passes through its sample exactly; its error says nothing
+        rms_pct = float(np.sqrt(np.mean(((predicted - v) / v) ** 2)) * 100) if len(c) >= 2 else None
+        models[powder] = PowderModel(powder, k, len(c), rms_pct)
+    return models
+
+
+def get_powder_models(catalog):
+    """Fitted models for this catalog revision, cached per (path, mtime)."""
+    key = (catalog.path, catalog.mtime)
+    models = _models_cache.get(key)
+    if models is None:
+        with _models_lock:
+            models = _models_cache.get(key)
+            if models is None:
+                models = fit_powder_models(catalog)
+                _models_cache.clear()  # only the current revision is worth keeping
+                _models_cache[key] = models
+    return models
+
+
+def estimate_charges(models, target_velocities, weight, powders=None):
+    """
+    Charges (grains) for every powder × target velocity in one batched call.
+
+    Returns (powder_names, charges) where charges has shape
+    (len(powder_names), len(target_velocities)).
+    """
+    names = [p for p in (powders if powders is not None else sorted(models)) if p in models]
+    k = np.array([models[p].k for p in names], dtype=float)
+    v = np.atleast_1d(np.asarray(target_velocities, dtype=float))
+    if not names:
+        return names, np.empty((0, v.size))
+    return names, np.outer(1.0 / k, v ** 2) * float(weight)
+
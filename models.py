@@ -1,7 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Date, Float, Text
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Date, DateTime, Float, Text, Index, UniqueConstraint, bindparam, event, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-import bcrypt
+from sqlalchemy.orm import sessionmaker, relationship, validates
+from datetime import datetime
+from functools import partial
+
+from components import normalize_component
+from passwords import hash_password, verify_password
+from units import base_unit, category_unit, factor
 
 Base = declarative_base()
 
@@ -18,19 +25,22 @@ class User(Base):
     cr_expiration = Column(Date) # Validade do CR
     address_acervo = Column(String) # Endereço do Acervo
     is_premium = Column(Integer, default=0) # 0=Free, 1=Premium
+    data_version = Column(Integer, default=0, server_default="0", nullable=False) # Bumped on any profile/acervo/logbook/stock change
     
     firearms = relationship("Firearm", back_populates="owner", cascade="all, delete-orphan")
     sessions = relationship("ReloadSession", back_populates="user", cascade="all, delete-orphan")
     inventory = relationship("InventoryItem", back_populates="user", cascade="all, delete-orphan")
+    custom_loads = relationship("CustomLoad", back_populates="user", cascade="all, delete-orphan")
 
     def set_password(self, password):
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return verify_password(password, self.password_hash)
 
 class Firearm(Base):
     __tablename__ = 'firearms'
+    __table_args__ = (Index('ix_firearms_user_id', 'user_id'),)
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     model = Column(String, nullable=False)
@@ -44,6 +54,8 @@ class Firearm(Base):
 
 class ReloadSession(Base):
     __tablename__ = 'reload_sessions'
+    # Logbook, reports and keyset pagination all filter by user and sort by date
+    __table_args__ = (Index('ix_reload_sessions_user_date', 'user_id', 'date', 'id'),)
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     firearm_id = Column(Integer, ForeignKey('firearms.id'), nullable=True)
@@ -56,6 +68,15 @@ class ReloadSession(Base):
     primer = Column(String)
     case = Column(String)
     quantity = Column(Integer)
+
+    # components.normalize_component() of the names above, kept in sync by validate_component
+    projectile_key = Column(String)
+    powder_key = Column(String)
+    primer_key = Column(String)
+    case_key = Column(String)
+
+    # Component cost per round, frozen at reload time from the FIFO lots consumed (inventory_service)
+    cost_per_round = Column(Float)
     
     velocity_avg = Column(Float)
     velocity_sd = Column(Float)
@@ -65,23 +86,441 @@ class ReloadSession(Base):
     user = relationship("User", back_populates="sessions")
     firearm = relationship("Firearm", back_populates="sessions")
 
+    @validates("projectile", "powder", "primer", "case")
+    def validate_component(self, field, value):
+        setattr(self, f"{field}_key", normalize_component(value))
+        return value
+
 class InventoryItem(Base):
     __tablename__ = 'inventory_items'
+    # Stock lookups go by (user, category, name_key); user-only filters use the prefix
+    __table_args__ = (Index('ix_inventory_items_user_category_key', 'user_id', 'category', 'name_key'),)
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     
     category = Column(String, nullable=False) # Polvora, Projetil, Espoleta, Estojo
     name = Column(String, nullable=False)
-    quantity = Column(Float, nullable=False)
-    unit = Column(String, nullable=False) # g, grains, un
-    price_unit = Column(Float, default=0.0) # Preço por unidade (ou por g/grain/un)
+    name_key = Column(String) # components.normalize_component(name)
+    quantity = Column(Float, nullable=False) # in `unit`
+    unit = Column(String, nullable=False) # base unit: gr (weighed) or un (counted), see units.py
+    display_unit = Column(String) # unit the user buys it in (g, grains, un, kg, lb)
+    price_unit = Column(Float, default=0.0) # Preço por unidade base (R$/grain ou R$/un)
     
     user = relationship("User", back_populates="inventory")
 
+    @validates("name")
+    def validate_name(self, field, value):
+        self.name_key = normalize_component(value)
+        return value
+
+class CustomLoad(Base):
+    """User-defined load data, layered over the shared catalog (catalog.UserCatalog)."""
+    __tablename__ = 'custom_loads'
+    __table_args__ = (UniqueConstraint('user_id', 'caliber', 'projectile', 'powder'),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+
+    caliber = Column(String, nullable=False)
+    projectile = Column(String, nullable=False)
+    powder = Column(String, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    unit = Column(String, default="grains")
+    velocity = Column(Float)
+    note = Column(Text)
+
+    user = relationship("User", back_populates="custom_loads")
+
+    def as_load(self):
+        """Same shape as a catalog entry in database.json."""
+        load = {"min": self.min, "max": self.max, "unit": self.unit or "grains", "note": self.note or ""}
+        if self.velocity:
+            load["velocity"] = self.velocity
+        return load
+
+class UserStats(Base):
+    """
+    Dashboard aggregates, one row per user. Kept current incrementally in the
+    same transaction as the change: by the flush listener below for ORM
+    writes and by adjust_user_stats() callers for bulk SQL.
+    """
+    __tablename__ = 'user_stats'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    total_investment = Column(Float, nullable=False, default=0.0, server_default="0") # sum(quantity * price_unit)
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")
+    powder_items = Column(Integer, nullable=False, default=0, server_default="0")
+    projectile_items = Column(Integer, nullable=False, default=0, server_default="0")
+    primer_items = Column(Integer, nullable=False, default=0, server_default="0")
+    case_items = Column(Integer, nullable=False, default=0, server_default="0")
+    other_items = Column(Integer, nullable=False, default=0, server_default="0")
+    session_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_rounds = Column(Integer, nullable=False, default=0, server_default="0")
+
+class StockMovement(Base):
+    """
+    Append-only stock ledger: every change to an item's quantity or value is
+    a row here (stock_ledger.py writes them). quantity and cost are signed
+    deltas in the item's base unit and in R$; category/item_name are copied at
+    write time so history survives item removal.
+    """
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        Index('ix_stock_movements_item_id', 'item_id', 'id'),
+        Index('ix_stock_movements_user_created', 'user_id', 'created_at'),
+    )
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    item_id = Column(Integer, nullable=False) # no FK: rows outlive the InventoryItem
+    reload_session_id = Column(Integer, ForeignKey('reload_sessions.id'), nullable=True)
+    kind = Column(String, nullable=False) # purchase, consumption, adjustment
+    quantity = Column(Float, nullable=False)
+    cost = Column(Float, nullable=False, default=0.0)
+    category = Column(String, nullable=False)
+    item_name = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class StockLot(Base):
+    """
+    One purchase of an item. Consumption draws from the oldest lots first
+    (FIFO, inventory_service), so a reload is costed at what its components
+    actually cost, frozen on the session.
+    """
+    __tablename__ = 'stock_lots'
+    __table_args__ = (Index('ix_stock_lots_item_fifo', 'item_id', 'purchased_at', 'id'),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('inventory_items.id'), nullable=False)
+    purchased_at = Column(DateTime, nullable=False, default=datetime.now)
+    quantity = Column(Float, nullable=False) # as purchased, in the item's base unit
+    remaining = Column(Float, nullable=False)
+    unit_cost = Column(Float, nullable=False, default=0.0) # R$ per base unit
+
+class StockSnapshot(Base):
+    """Running totals of an item's movements up to last_movement_id (stock_ledger.take_snapshots)."""
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (
+        Index('ix_stock_snapshots_item', 'item_id', 'last_movement_id'),
+        Index('ix_stock_snapshots_user_taken', 'user_id', 'taken_at'),
+    )
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    item_id = Column(Integer, nullable=False)
+    last_movement_id = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, nullable=False) # created_at of the last included movement
+    quantity = Column(Float, nullable=False)
+    value = Column(Float, nullable=False)
+    category = Column(String, nullable=False)
+    item_name = Column(String, nullable=False)
+
+class ComponentUsage(Base):
+    """
+    Daily consumption per stock item, in its base unit, by the date of the
+    sessions that used it. Maintained by upsert on every session save
+    (forecast.record_usage) so consumption rates never rescan the logbook.
+    """
+    __tablename__ = 'component_usage'
+    __table_args__ = (
+        UniqueConstraint('item_id', 'day'),
+        Index('ix_component_usage_user_day', 'user_id', 'day'),
+    )
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    item_id = Column(Integer, nullable=False) # no FK: history outlives the InventoryItem
+    day = Column(Date, nullable=False)
+    quantity = Column(Float, nullable=False, default=0.0)
+
+# Stock category -> UserStats counter
+STATS_CATEGORY_COLUMNS = {
+    "Pólvora": "powder_items",
+    "Projétil": "projectile_items",
+    "Espoleta": "primer_items",
+    "Estojo": "case_items",
+}
+
+# Indexes replaced by later ones; left in place they only slow writes and mislead the planner
+DROPPED_INDEXES = ("ix_inventory_items_user_category_name",)
+
+def migrate_schema(engine):
+    """
+    create_all() only creates missing tables; add columns and indexes
+    introduced after a table already existed (SQLite ALTER TABLE ADD COLUMN /
+    CREATE INDEX) so old databases keep working.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column.type.compile(engine.dialect)}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+            existing_indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+        for name in DROPPED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
 # Database setup
-engine = create_engine('sqlite:///ballistics.db')
+DATABASE_URL = 'sqlite:///ballistics.db'
+
+# Connection pool: Streamlit serves each browser session from its own thread,
+# so connections are shared across threads (check_same_thread off) and a
+# small pool is kept open instead of reconnecting on every rerun.
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 10
+POOL_TIMEOUT = 30 # seconds waiting for a free connection
+BUSY_TIMEOUT_MS = 5000 # how long a writer waits on SQLite's lock before "database is locked"
+
+# Applied to every new connection. WAL lets readers run concurrently with the
+# (single) writer; synchronous=NORMAL is durable in WAL mode except on power
+# loss, where at most the last commits are lost, never the database.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA cache_size=-16000", # KiB, i.e. 16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+)
+
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=QueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+    pool_pre_ping=True,
+    connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT_MS / 1000},
+)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+def backfill_component_keys(engine):
+    """Fills *_key columns left NULL by migrate_schema on rows created before they existed."""
+    jobs = [
+        (InventoryItem.__table__, [("name", "name_key")]),
+        (ReloadSession.__table__, [(f, f"{f}_key") for f in ("projectile", "powder", "primer", "case")]),
+    ]
+    with engine.begin() as conn:
+        for table, pairs in jobs:
+            for src, dst in pairs:
+                rows = conn.execute(
+                    select(table.c.id, table.c[src]).where(table.c[dst].is_(None), table.c[src].isnot(None))
+                ).all()
+                if rows:
+                    conn.execute(
+                        table.update().where(table.c.id == bindparam("row_id")).values({dst: bindparam("key")}),
+                        [{"row_id": row_id, "key": normalize_component(value)} for row_id, value in rows]
+                    )
+
+def migrate_base_units(engine):
+    """
+    Converts stock items still in the unit they were typed in (display_unit
+    not set yet) to their base unit, together with their lots, ledger
+    movements and snapshots, so every stored quantity of an item is in the
+    same unit. Values in R$ do not change. Items typed in a unit that does
+    not measure their category (grams of primers) or in an unknown unit keep
+    that dimension, so consumption and the planner skip them until re-added.
+    """
+    with engine.begin() as conn:
+        pairs = conn.execute(text(
+            "SELECT DISTINCT category, unit FROM inventory_items WHERE display_unit IS NULL"
+        )).all()
+        for category, unit in pairs:
+            base = base_unit(unit)
+            if base != category_unit(category):
+                print(f"Stock in {unit!r} cannot be converted to {category_unit(category)} "
+                      f"for {category}; left out of consumption until re-added.")
+            params = {"category": category, "unit": unit, "base": base or unit, "f": factor(unit)}
+            items = "SELECT id FROM inventory_items WHERE display_unit IS NULL AND category = :category AND unit = :unit"
+            if params["f"] != 1.0:
+                conn.execute(text(f"""
+                    UPDATE stock_lots SET quantity = quantity * :f, remaining = remaining * :f, unit_cost = unit_cost / :f
+                    WHERE item_id IN ({items})
+                """), params)
+                for table in ("stock_movements", "stock_snapshots"):
+                    conn.execute(text(f"UPDATE {table} SET quantity = quantity * :f WHERE item_id IN ({items})"), params)
+            conn.execute(text("""
+                UPDATE inventory_items
+                SET display_unit = unit, unit = :base, quantity = quantity * :f, price_unit = price_unit / :f
+                WHERE display_unit IS NULL AND category = :category AND unit = :unit
+            """), params)
+
+def backfill_user_stats(engine, user_ids=None):
+    """
+    (Re)builds UserStats from scratch for the given users, or for every user
+    without a row yet (databases created before the table existed).
+    """
+    cat = STATS_CATEGORY_COLUMNS
+    params = {f"cat_{col}": name for name, col in cat.items()}
+    counters = ",\n".join(
+        f"(SELECT COUNT(*) FROM inventory_items i WHERE i.user_id = u.id AND i.category = :cat_{col})"
+        for col in cat.values()
+    )
+    known = ", ".join(f":cat_{col}" for col in cat.values())
+    if user_ids is None:
+        where = "u.id NOT IN (SELECT user_id FROM user_stats)"
+    else:
+        where = "u.id IN (" + ", ".join(str(int(uid)) for uid in user_ids) + ")"
+    with engine.begin() as conn:
+        if user_ids is not None:
+            conn.execute(text(f"DELETE FROM user_stats WHERE user_id IN (SELECT u.id FROM users u WHERE {where})"))
+        conn.execute(text(f"""
+            INSERT INTO user_stats (user_id, total_investment, item_count, {", ".join(cat.values())},
+                                    other_items, session_count, total_rounds)
+            SELECT u.id,
+                (SELECT COALESCE(SUM(i.quantity * COALESCE(i.price_unit, 0)), 0) FROM inventory_items i WHERE i.user_id = u.id),
+                (SELECT COUNT(*) FROM inventory_items i WHERE i.user_id = u.id),
+                {counters},
+                (SELECT COUNT(*) FROM inventory_items i WHERE i.user_id = u.id AND i.category NOT IN ({known})),
+                (SELECT COUNT(*) FROM reload_sessions r WHERE r.user_id = u.id),
+                (SELECT COALESCE(SUM(r.quantity), 0) FROM reload_sessions r WHERE r.user_id = u.id)
+            FROM users u
+            WHERE {where}
+        """), params)
+
+def backfill_stock_ledger(engine):
+    """Opening-balance adjustment for stock items that predate the ledger."""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO stock_movements (user_id, item_id, kind, quantity, cost, category, item_name, created_at)
+            SELECT i.user_id, i.id, 'adjustment', i.quantity, i.quantity * COALESCE(i.price_unit, 0),
+                   i.category, i.name, :now
+            FROM inventory_items i
+            WHERE NOT EXISTS (SELECT 1 FROM stock_movements m WHERE m.item_id = i.id)
+        """).bindparams(bindparam("now", type_=DateTime)), {"now": datetime.now()})
+
+def backfill_stock_lots(engine):
+    """Opening lot (current quantity at the current average price) for items that predate lots."""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO stock_lots (user_id, item_id, purchased_at, quantity, remaining, unit_cost)
+            SELECT i.user_id, i.id, :now, i.quantity, i.quantity, COALESCE(i.price_unit, 0)
+            FROM inventory_items i
+            WHERE i.quantity > 0 AND NOT EXISTS (SELECT 1 FROM stock_lots l WHERE l.item_id = i.id)
+        """).bindparams(bindparam("now", type_=DateTime)), {"now": datetime.now()})
+
+def backfill_component_usage(engine):
+    """Daily usage from the ledger's consumption movements, for items that have none yet."""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO component_usage (user_id, item_id, day, quantity)
+            SELECT m.user_id, m.item_id, r.date, -SUM(m.quantity)
+            FROM stock_movements m JOIN reload_sessions r ON r.id = m.reload_session_id
+            WHERE m.kind = 'consumption'
+              AND NOT EXISTS (SELECT 1 FROM component_usage u WHERE u.item_id = m.item_id)
+            GROUP BY m.user_id, m.item_id, r.date
+        """))
+
 Base.metadata.create_all(engine)
+migrate_schema(engine)
+migrate_base_units(engine)
+backfill_component_keys(engine)
+backfill_user_stats(engine)
+backfill_stock_ledger(engine)
+backfill_stock_lots(engine)
+backfill_component_usage(engine)
 Session = sessionmaker(bind=engine)
 
+# --- Per-user data version ---
+# Anything shown in the inspection report (profile, firearms, sessions,
+# stock) bumps users.data_version in the same flush, so cached derived data
+# (report_gen) can be keyed on (user_id, data_version).
+_VERSIONED = ("Firearm", "ReloadSession", "InventoryItem")
+
+def bump_data_version(session, user_ids):
+    """Explicit bump for changes made with bulk SQL that bypasses the ORM."""
+    user_ids = {uid for uid in user_ids if uid is not None}
+    if user_ids:
+        session.execute(
+            User.__table__.update().where(User.id.in_(user_ids)).values(data_version=User.data_version + 1)
+        )
+
+@event.listens_for(Session, "after_flush")
+def _bump_versions_after_flush(session, flush_context):
+    user_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if type(obj).__name__ in _VERSIONED:
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, User) and obj not in session.new and session.is_modified(obj, include_collections=False):
+            user_ids.add(obj.id)
+    bump_data_version(session, user_ids)
+
+# --- Incremental dashboard aggregates (UserStats) ---
+# before_flush turns pending ORM changes to stock and sessions into per-user
+# deltas (old values from attribute history); after_flush applies them as
+# relative upserts, inside the flush's transaction.
+
+def adjust_user_stats(session, user_id, **deltas):
+    """Adds the given deltas to the user's UserStats row, creating it if needed."""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if user_id is None or not deltas:
+        return
+    table = UserStats.__table__
+    stmt = sqlite_insert(table).values(user_id=user_id, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={k: table.c[k] + stmt.excluded[k] for k in deltas},
+    )
+    session.execute(stmt)
+
+def _old_value(session, obj, attr):
+    """Value as last stored in the database, before this flush's changes."""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if not history.added:
+        return getattr(obj, attr)
+    # Set on an expired instance, so the previous value was never loaded: read the row
+    table = obj.__table__
+    return session.connection().execute(select(table.c[attr]).where(table.c.id == obj.id)).scalar()
+
+def _stats_contribution(obj, value):
+    """UserStats counters one row accounts for; value(attr) reads the old or new state."""
+    if isinstance(obj, InventoryItem):
+        quantity, price, category = value("quantity"), value("price_unit"), value("category")
+        return {
+            "total_investment": (quantity or 0) * (price or 0),
+            "item_count": 1,
+            STATS_CATEGORY_COLUMNS.get(category, "other_items"): 1,
+        }
+    return {"session_count": 1, "total_rounds": value("quantity") or 0}
+
+def _add_contribution(deltas, obj, value, sign):
+    user_deltas = deltas.setdefault(obj.user_id, {})
+    for k, v in _stats_contribution(obj, value).items():
+        user_deltas[k] = user_deltas.get(k, 0) + sign * v
+
+@event.listens_for(Session, "before_flush")
+def _collect_stats_deltas(session, flush_context, instances):
+    deltas = session.info.setdefault("_stats_deltas", {})
+    tracked = (InventoryItem, ReloadSession)
+    for obj in session.new:
+        if isinstance(obj, tracked):
+            _add_contribution(deltas, obj, partial(getattr, obj), +1)
+    for obj in session.deleted:
+        if isinstance(obj, tracked):
+            _add_contribution(deltas, obj, partial(_old_value, session, obj), -1)
+    for obj in session.dirty:
+        if isinstance(obj, tracked) and session.is_modified(obj, include_collections=False):
+            _add_contribution(deltas, obj, partial(_old_value, session, obj), -1)
+            _add_contribution(deltas, obj, partial(getattr, obj), +1)
+
+@event.listens_for(Session, "after_flush")
+def _apply_stats_deltas(session, flush_context):
+    for user_id, user_deltas in session.info.pop("_stats_deltas", {}).items():
+        adjust_user_stats(session, user_id, **user_deltas)
+
 def get_session():
     return Session()
@@ -0,0 +1,59 @@
+"""
+Password hashing: bcrypt with a configurable work factor, run on a small
+bounded thread pool.
+
+bcrypt releases the GIL while hashing, so a burst of logins (a whole club
+opening the app at once) runs on up to HASH_WORKERS cores in parallel. No
+more hashes than that run at once, so the burst cannot starve the threads
+rendering everyone else's pages; extra requests wait in the pool's queue.
+
+Hashes carry their own cost, so changing BCRYPT_ROUNDS needs no migration:
+needs_rehash() spots hashes made with another cost and the login path
+re-hashes them while it has the plain password.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# bcrypt cost (2^rounds iterations); each +1 doubles the time per login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_password(password, rounds=None):
+    """bcrypt hash of password at `rounds` (default BCRYPT_ROUNDS), computed on the pool."""
+    return _pool.submit(_hash, password, rounds or BCRYPT_ROUNDS).result()
+
+
+def verify_password(password, password_hash):
+    """True if password matches password_hash; computed on the pool."""
+    if not password_hash:
+        return False
+    try:
+        return _pool.submit(_check, password, password_hash).result()
+    except ValueError: # not a bcrypt hash
+        return False
+
+
+def hash_rounds(password_hash):
+    """Cost a bcrypt hash was made with ("$2b$12$..." -> 12), or None."""
+    try:
+        return int(password_hash.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash, rounds=None):
+    """True if the hash was made with a cost other than `rounds` (default BCRYPT_ROUNDS)."""
+    return hash_rounds(password_hash) != (rounds or BCRYPT_ROUNDS)
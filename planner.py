@@ -0,0 +1,157 @@
+"""
+Build-capacity planner: how many rounds of each load the current stock can
+still make.
+
+Every catalog or custom load whose powder and projectile are in stock is
+crossed with the user's stock at once. Each load becomes a row of four
+stock indexes (powder, projectile, primer, case) and four amounts per round
+(charge in grains, 1, 1, 1). The rounds each component allows are then
+stock[idx] / need, and a load's capacity is the row minimum: one numpy
+gather, one divide and one min over the whole matrix. argmin names the
+bottleneck.
+
+Loads carry no primer or case, so those come from the user's most recent
+session of the same caliber. A caliber never reloaded has no known primer
+or case, and they do not limit it.
+
+Results are cached per (user, users.data_version), so they are recomputed
+only after a stock or session change.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from sqlalchemy import func
+
+from components import lookup_keys, normalize_component, strip_brand
+from models import InventoryItem, ReloadSession
+from units import category_unit, factor
+
+PLAN_CACHE_SIZE = 64
+
+COMPONENTS = ("Pólvora", "Projétil", "Espoleta", "Estojo")
+
+# rounds: how many the stock allows; bottleneck: category that runs out first
+Capacity = namedtuple("Capacity", "caliber projectile powder charge primer case rounds bottleneck")
+
+
+class _Stock:
+    """The user's stock as a quantity vector plus a (category, key) -> position map."""
+
+    def __init__(self, db_session, user_id):
+        self.index = {}
+        quantities = []
+        for category, name_key, quantity, unit in (
+            db_session.query(InventoryItem.category, InventoryItem.name_key, InventoryItem.quantity, InventoryItem.unit)
+            .filter(InventoryItem.user_id == user_id)
+            .order_by(InventoryItem.id)
+        ):
+            # Same rule as consumption: legacy items in another unit are not drawn from
+            if (category, name_key) in self.index or unit != category_unit(category):
+                continue
+            self.index[(category, name_key)] = len(quantities)
+            quantities.append(max(quantity or 0.0, 0.0))
+        # Brand-less forms too, so catalog names like "124gr FMJ" find "CBC 124gr FMJ"
+        for (category, name_key), position in list(self.index.items()):
+            self.index.setdefault((category, strip_brand(name_key)), position)
+        # Two extra slots: a component not in stock (0) and one not known (no limit)
+        self.missing, self.unknown = len(quantities), len(quantities) + 1
+        self.quantities = np.array(quantities + [0.0, np.inf])
+
+    def find(self, category, name):
+        """Position of the stock item for a component name, or None."""
+        for key in lookup_keys(name):
+            for k in (key, strip_brand(key)):
+                if (category, k) in self.index:
+                    return self.index[(category, k)]
+        return None
+
+
+def _last_primer_and_case(db_session, user_id):
+    """{caliber: (primer, case)} from the user's most recent session of each caliber."""
+    rs = ReloadSession
+    # SQLite returns the bare primer/case columns from the max(date) row
+    rows = (
+        db_session.query(rs.caliber, rs.primer, rs.case, func.max(rs.date))
+        .filter(rs.user_id == user_id)
+        .group_by(rs.caliber)
+    )
+    return {caliber: (primer, case) for caliber, primer, case, _ in rows}
+
+
+def _candidate_loads(user_catalog, stock):
+    """Catalog and custom loads whose powder and projectile are both in stock."""
+    loads = []
+    for powder in user_catalog.powder_names:
+        if stock.find("Pólvora", powder) is None:
+            continue
+        for load in user_catalog.query(powder=powder):
+            if load.max and stock.find("Projétil", load.projectile) is not None:
+                loads.append(load)
+    return loads
+
+
+def build_capacity(db_session, user_id, user_catalog):
+    """
+    Capacity per load, largest first. Charges are the load's maximum, the
+    conservative count.
+    """
+    stock = _Stock(db_session, user_id)
+    loads = _candidate_loads(user_catalog, stock)
+    if not loads:
+        return []
+    history = _last_primer_and_case(db_session, user_id)
+
+    idx = np.empty((len(loads), len(COMPONENTS)), dtype=np.intp)
+    need = np.ones((len(loads), len(COMPONENTS)))
+    primers, cases = [], []
+    for row, load in enumerate(loads):
+        primer, case = history.get(load.caliber, (None, None))
+        primers.append(primer)
+        cases.append(case)
+        names = (load.powder, load.projectile, primer, case)
+        for col, (category, name) in enumerate(zip(COMPONENTS, names)):
+            if not (name or "").strip():
+                idx[row, col] = stock.unknown
+            else:
+                found = stock.find(category, name)
+                idx[row, col] = stock.missing if found is None else found
+        need[row, 0] = load.max * factor(load.unit)
+
+    per_component = stock.quantities[idx] / need
+    rounds = np.floor(per_component.min(axis=1)).astype(int)
+    bottleneck = per_component.argmin(axis=1)
+
+    result = [
+        Capacity(load.caliber, load.projectile, load.powder, float(need[row, 0]),
+                 primers[row], cases[row], int(rounds[row]), COMPONENTS[bottleneck[row]])
+        for row, load in enumerate(loads)
+    ]
+    return sorted(result, key=lambda c: (-c.rounds, c.caliber, normalize_component(c.projectile)))
+
+
+# Plans keyed by (user id, users.data_version, catalog version, custom loads)
+_plan_cache = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def get_build_capacity(db_session, user, user_catalog):
+    """build_capacity(), recomputed only when the user's data or loads change."""
+    custom = tuple(sorted(
+        (key, load.get("max"), load.get("unit")) for key, load in user_catalog.custom_loads.items()
+    ))
+    key = (user.id, user.data_version, getattr(user_catalog.base, "mtime", None), custom)
+    with _plan_cache_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            return plan
+
+    plan = build_capacity(db_session, user.id, user_catalog)
+    with _plan_cache_lock:
+        for stale in [k for k in _plan_cache if k[0] == user.id]:
+            del _plan_cache[stale]
+        _plan_cache[key] = plan
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
@@ -0,0 +1,165 @@
+"""
+Shared read queries that page through a user's rows in index order
+(reports, logbook and stock views), plus the cost report aggregates.
+
+Keyset (seek) pagination: every chunk continues strictly after the last
+(sort key, id) seen, so the cost per chunk stays constant however deep into
+the history we are, unlike OFFSET which rescans everything it skips.
+"""
+from collections import namedtuple
+
+from sqlalchemy import and_, func, or_, tuple_
+
+from components import lookup_keys, normalize_component
+from models import Firearm, InventoryItem, ReloadSession
+
+DEFAULT_CHUNK_SIZE = 500
+PAGE_SIZE = 25
+
+# cost_summary() groupings -> SQL expression labelling each group
+COST_GROUPS = {
+    "caliber": ReloadSession.caliber,
+    "month": func.strftime("%Y-%m", ReloadSession.date),
+    "firearm": func.coalesce(Firearm.model, ""),
+}
+
+# rows: the page's ORM objects; next_cursor: pass as `after` for the following
+# page (None on the last page); total: rows matching the filters
+Page = namedtuple("Page", "rows next_cursor total")
+CostRow = namedtuple("CostRow", "group sessions rounds total_cost avg_cost_per_round")
+
+
+def _after_session(cursor):
+    """Rows strictly after (date, id) in newest-first order."""
+    last_date, last_id = cursor
+    return or_(
+        ReloadSession.date < last_date,
+        and_(ReloadSession.date == last_date, ReloadSession.id < last_id),
+    )
+
+
+def session_filters(user_id, caliber=None, powder=None, date_from=None, date_to=None):
+    """SQL filter clauses for the logbook; powder goes through the normalized key."""
+    clauses = [ReloadSession.user_id == user_id]
+    if caliber:
+        clauses.append(ReloadSession.caliber == caliber)
+    if powder:
+        clauses.append(ReloadSession.powder_key.in_(lookup_keys(powder)))
+    if date_from:
+        clauses.append(ReloadSession.date >= date_from)
+    if date_to:
+        clauses.append(ReloadSession.date <= date_to)
+    return clauses
+
+
+def sessions_page(db_session, user_id, after=None, limit=PAGE_SIZE, with_total=True, **filters):
+    """
+    One logbook page, newest first, continuing after the `after` cursor.
+    Seeks the (user_id, date, id) index, so page N costs the same as page 1.
+    """
+    clauses = session_filters(user_id, **filters)
+    q = db_session.query(ReloadSession).filter(*clauses)
+    if after is not None:
+        q = q.filter(_after_session(after))
+    rows = q.order_by(ReloadSession.date.desc(), ReloadSession.id.desc()).limit(limit + 1).all()
+    next_cursor = (rows[limit - 1].date, rows[limit - 1].id) if len(rows) > limit else None
+    total = db_session.query(func.count(ReloadSession.id)).filter(*clauses).scalar() if with_total else None
+    return Page(rows[:limit], next_cursor, total)
+
+
+def session_calibers(db_session, user_id):
+    """Distinct calibers in the user's logbook, for the filter widget."""
+    return [c for (c,) in (
+        db_session.query(ReloadSession.caliber).filter(ReloadSession.user_id == user_id)
+        .distinct().order_by(ReloadSession.caliber)
+    )]
+
+
+def inventory_page(db_session, user_id, after=None, limit=PAGE_SIZE, category=None, search=None, with_total=True):
+    """
+    One stock page ordered by (category, name_key, id), continuing after the
+    `after` cursor; served by the (user_id, category, name_key) index.
+    search matches any part of the normalized name.
+    """
+    clauses = [InventoryItem.user_id == user_id]
+    if category:
+        clauses.append(InventoryItem.category == category)
+    if search:
+        for token in normalize_component(search).split():
+            clauses.append(InventoryItem.name_key.contains(token, autoescape=True))
+    q = db_session.query(InventoryItem).filter(*clauses)
+    if after is not None:
+        q = q.filter(tuple_(InventoryItem.category, InventoryItem.name_key, InventoryItem.id) > tuple_(*after))
+    rows = q.order_by(InventoryItem.category, InventoryItem.name_key, InventoryItem.id).limit(limit + 1).all()
+    last = rows[limit - 1] if len(rows) > limit else None
+    next_cursor = (last.category, last.name_key, last.id) if last is not None else None
+    total = db_session.query(func.count(InventoryItem.id)).filter(*clauses).scalar() if with_total else None
+    return Page(rows[:limit], next_cursor, total)
+
+
+def iter_sessions_keyset(db_session, user_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields lists of (id, date, caliber, projectile, powder, charge, quantity)
+    rows for the user's reload sessions, newest first, at most chunk_size at a
+    time. Plain column tuples: no ORM identity map growing across chunks.
+    """
+    cols = (
+        ReloadSession.id, ReloadSession.date, ReloadSession.caliber, ReloadSession.projectile,
+        ReloadSession.powder, ReloadSession.charge, ReloadSession.quantity,
+    )
+    base = db_session.query(*cols).filter(ReloadSession.user_id == user_id)
+    last = None
+    while True:
+        q = base
+        if last is not None:
+            q = q.filter(_after_session((last.date, last.id)))
+        rows = q.order_by(ReloadSession.date.desc(), ReloadSession.id.desc()).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1]
+
+
+def iter_firearms_keyset(db_session, user_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields lists of the user's Firearm rows ordered by id, chunk_size at a time."""
+    last_id = 0
+    while True:
+        rows = (
+            db_session.query(Firearm)
+            .filter(Firearm.user_id == user_id, Firearm.id > last_id)
+            .order_by(Firearm.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1].id
+
+
+def cost_summary(db_session, user_id, group_by="caliber", date_from=None, date_to=None):
+    """
+    Reloading cost per caliber, month or firearm, aggregated by SQLite from
+    the frozen ReloadSession.cost_per_round; one GROUP BY query, no rows
+    loaded. Sessions without a cost yet count as zero. Largest total first.
+    """
+    if group_by not in COST_GROUPS:
+        raise ValueError(f"Unknown cost grouping: {group_by}")
+    group = COST_GROUPS[group_by].label("grp")
+    rounds = func.coalesce(func.sum(ReloadSession.quantity), 0)
+    total = func.coalesce(func.sum(func.coalesce(ReloadSession.cost_per_round, 0) * ReloadSession.quantity), 0.0)
+    q = (
+        db_session.query(group, func.count(ReloadSession.id), rounds, total)
+        .filter(*session_filters(user_id, date_from=date_from, date_to=date_to))
+    )
+    if group_by == "firearm":
+        q = q.outerjoin(Firearm, Firearm.id == ReloadSession.firearm_id)
+    rows = q.group_by(group).order_by(total.desc()).all()
+    return [
+        CostRow(grp, count, n_rounds, round(float(cost), 2), round(cost / n_rounds, 4) if n_rounds else 0.0)
+        for grp, count, n_rounds, cost in rows
+    ]
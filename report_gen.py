@@ -1,28 +1,148 @@
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, Frame, LayoutError
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
 from io import BytesIO
 from datetime import datetime
+from collections import OrderedDict
+import tempfile
+import threading
 import os
 
-def create_inspection_report(user):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, title=f"Relatório {user.name}")
+from queries import iter_firearms_keyset, iter_sessions_keyset, sessions_page
+
+LOGO_FILE = "logo.png"
+LOGO_SIZE = 50 # points
+REPORT_CACHE_SIZE = 64
+FULL_REPORT_SPOOL_SIZE = 8 * 1024 * 1024 # bytes kept in RAM before the full report spills to disk
+FULL_REPORT_ROWS_PER_TABLE = 40 # about a page of log rows per Table flowable
+
+# Loaded once per process: the stylesheet and a downscaled copy of the logo
+# (the source PNG is ~700 KB and would otherwise be decoded on every build)
+_styles = None
+_logo_bytes = None
+_assets_lock = threading.Lock()
+
+def _get_styles():
+    global _styles
+    if _styles is None:
+        with _assets_lock:
+            if _styles is None:
+                styles = getSampleStyleSheet()
+                styles.add(ParagraphStyle(name='NormalCentered', parent=styles['Normal'], alignment=TA_CENTER))
+                _styles = styles
+    return _styles
+
+def _get_logo_bytes():
+    global _logo_bytes
+    if _logo_bytes is None and os.path.exists(LOGO_FILE):
+        with _assets_lock:
+            if _logo_bytes is None:
+                try:
+                    from PIL import Image as PILImage
+                    with PILImage.open(LOGO_FILE) as img:
+                        img.thumbnail((LOGO_SIZE * 4, LOGO_SIZE * 4)) # ~4x for print resolution
+                        out = BytesIO()
+                        img.save(out, format="PNG")
+                    _logo_bytes = out.getvalue()
+                except Exception:
+                    with open(LOGO_FILE, "rb") as f:
+                        _logo_bytes = f.read()
+    return _logo_bytes
+
+def _logo_flowable():
+    logo = _get_logo_bytes()
+    if logo is None:
+        return None
+    im = Image(BytesIO(logo), width=LOGO_SIZE, height=LOGO_SIZE)
+    im.hAlign = 'LEFT'
+    return im
+
+# Rendered reports keyed by (user id, users.data_version, issue time)
+_report_cache = OrderedDict()
+_report_cache_lock = threading.Lock()
+
+def _issued_at():
+    """Issue time printed on a report, to the minute."""
+    return datetime.now().strftime('%d/%m/%Y %H:%M')
+
+def get_inspection_report(db_session, user):
+    """
+    Inspection report bytes, rebuilt only when the user's data version
+    changes (models bumps it on any profile, firearm, session or stock change)
+    or the issue time printed on it does.
+    """
+    issued = _issued_at()
+    key = (user.id, user.data_version, issued)
+    with _report_cache_lock:
+        data = _report_cache.get(key)
+        if data is not None:
+            _report_cache.move_to_end(key)
+            return data
+
+    data = create_inspection_report(db_session, user, issued)
+    with _report_cache_lock:
+        # Older versions of this user's report are dead entries
+        for stale in [k for k in _report_cache if k[0] == user.id]:
+            del _report_cache[stale]
+        _report_cache[key] = data
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+    return data
+
+LOG_HEADER = ["Data", "Calibre", "Componentes (Projétil | Pólvora)", "Carga", "Qtd"]
+LOG_COL_WIDTHS = [60, 100, 200, 60, 50]
+LOG_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0,0), (-1,0), colors.darkred),
+    ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+    ('GRID', (0,0), (-1,-1), 1, colors.black),
+    ('FONTSIZE', (0,0), (-1,-1), 9),
+    ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.whitesmoke, colors.white])
+])
+
+def _log_row(s):
+    """Logbook table row; works for ReloadSession objects and column tuples alike."""
+    return [
+        s.date.strftime('%d/%m/%Y'),
+        s.caliber,
+        f"{s.projectile}\n{s.powder}",
+        f"{s.charge} gr",
+        f"{s.quantity} un"
+    ]
+
+def _log_table(rows):
+    t_log = Table([LOG_HEADER] + rows, colWidths=LOG_COL_WIDTHS, repeatRows=1)
+    t_log.setStyle(LOG_TABLE_STYLE)
+    return t_log
+
+FIREARMS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0,0), (-1,0), colors.darkblue),
+    ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0,0), (-1,0), 8),
+    ('GRID', (0,0), (-1,-1), 1, colors.black),
+    ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.whitesmoke, colors.white])
+])
+
+def _report_head(user, styles, issued=None):
+    """Header and shooter data (section 1)."""
     elements = []
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='NormalCentered', parent=styles['Normal'], alignment=TA_CENTER))
-    
+
     # Header
-    if os.path.exists("logo.png"):
-        im = Image("logo.png", width=50, height=50)
-        im.hAlign = 'LEFT'
-        elements.append(im)
+    logo = _logo_flowable()
+    if logo is not None:
+        elements.append(logo)
         
     title = Paragraph("<b>BALLISTIC PRO - RELATÓRIO DE ACERVO E ATIVIDADES</b>", styles['Title'])
     elements.append(title)
-    elements.append(Paragraph(f"Emitido em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+    elements.append(Paragraph(f"Emitido em: {issued or _issued_at()}", styles['Normal']))
     elements.append(Spacer(1, 12))
     
     # 1. User Info
@@ -49,77 +169,160 @@ def create_inspection_report(user):
     ]))
     elements.append(t_user)
     elements.append(Spacer(1, 18))
+    return elements
+
+def _firearms_table(firearms):
+    # Header Row
+    data_guns = [["Tipo/Modelo", "Nº Série", "SIGMA", "CRAF", "Validade"]]
+    for f in firearms:
+        exp_date = f.expiration.strftime('%d/%m/%Y') if f.expiration else '-'
+        data_guns.append([
+            f.model, 
+            f.serial or "-", 
+            f.sigma or "-", 
+            f.craf or "-", 
+            exp_date
+        ])
+    
+    t_guns = Table(data_guns, colWidths=[150, 80, 80, 80, 80], repeatRows=1)
+    t_guns.setStyle(FIREARMS_TABLE_STYLE)
+    return t_guns
+
+def _report_footer(user, styles):
+    return [
+        Spacer(1, 30),
+        Paragraph("_" * 50, styles['NormalCentered']),
+        Paragraph(f"<b>{user.name}</b>", styles['NormalCentered']),
+        Paragraph("Responsável pelo Acervo", styles['NormalCentered']),
+    ]
+
+def create_inspection_report(db_session, user, issued=None):
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title=f"Relatório {user.name}")
+    styles = _get_styles()
+    elements = _report_head(user, styles, issued)
 
     # 2. Arsenal (Acervo)
     elements.append(Paragraph("<b>2. ACERVO DE ARMAS CADASTRADO</b>", styles['Heading4']))
     if user.firearms:
-        # Header Row
-        data_guns = [["Tipo/Modelo", "Nº Série", "SIGMA", "CRAF", "Validade"]]
-        for f in user.firearms:
-            exp_date = f.expiration.strftime('%d/%m/%Y') if f.expiration else '-'
-            data_guns.append([
-                f.model, 
-                f.serial or "-", 
-                f.sigma or "-", 
-                f.craf or "-", 
-                exp_date
-            ])
-        
-        t_guns = Table(data_guns, colWidths=[150, 80, 80, 80, 80])
-        t_guns.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.darkblue),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0,0), (-1,0), 8),
-            ('GRID', (0,0), (-1,-1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.whitesmoke, colors.white])
-        ]))
-        elements.append(t_guns)
+        elements.append(_firearms_table(user.firearms))
     else:
         elements.append(Paragraph("<i>Nenhuma arma cadastrada neste perfil.</i>", styles['Normal']))
-    
     elements.append(Spacer(1, 18))
 
     # 3. Reload Log (Logbook)
     elements.append(Paragraph("<b>3. REGISTRO DE RECARGAS (Últimas 30 Atividades)</b>", styles['Heading4']))
-    if user.sessions:
-        data_log = [["Data", "Calibre", "Componentes (Projétil | Pólvora)", "Carga", "Qtd"]]
-        
-        # Sort chronologically desc
-        sessions = sorted(user.sessions, key=lambda x: x.date, reverse=True)[:30]
-        
-        for s in sessions:
-            components = f"{s.projectile}\n{s.powder}"
-            data_log.append([
-                s.date.strftime('%d/%m/%Y'),
-                s.caliber,
-                components,
-                f"{s.charge} gr",
-                f"{s.quantity} un"
-            ])
-            
-        t_log = Table(data_log, colWidths=[60, 100, 200, 60, 50])
-        t_log.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.darkred),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('GRID', (0,0), (-1,-1), 1, colors.black),
-            ('FONTSIZE', (0,0), (-1,-1), 9),
-            ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.whitesmoke, colors.white])
-        ]))
-        elements.append(t_log)
+    # Newest 30 straight from the (user_id, date, id) index, not the whole logbook
+    sessions = sessions_page(db_session, user.id, limit=30, with_total=False).rows
+    if sessions:
+        elements.append(_log_table([_log_row(s) for s in sessions]))
     else:
         elements.append(Paragraph("<i>Nenhuma atividade de recarga registrada.</i>", styles['Normal']))
 
     # Footer
-    elements.append(Spacer(1, 30))
-    elements.append(Paragraph("_" * 50, styles['NormalCentered']))
-    elements.append(Paragraph(f"<b>{user.name}</b>", styles['NormalCentered']))
-    elements.append(Paragraph("Responsável pelo Acervo", styles['NormalCentered']))
+    elements.extend(_report_footer(user, styles))
 
     doc.build(elements)
     buffer.seek(0)
     return buffer.getvalue()
+
+
+# --- Full history (audit) report ---
+
+class _PageFlow:
+    """
+    Lays flowables onto a canvas one page at a time, like SimpleDocTemplate
+    but fed incrementally: each flowable is drawn as soon as it is added and
+    dropped, so only the current page's content exists as Python objects.
+    """
+    def __init__(self, c, pagesize=A4, margin=inch):
+        self.c = c
+        self.pagesize = pagesize
+        self.margin = margin
+        self.frame = self._new_frame()
+        self.page_empty = True
+
+    def _new_frame(self):
+        width, height = self.pagesize
+        return Frame(self.margin, self.margin, width - 2 * self.margin, height - 2 * self.margin)
+
+    def add(self, flowable):
+        pending = [flowable]
+        while pending:
+            f = pending.pop(0)
+            if self.frame.add(f, self.c):
+                self.page_empty = False
+                continue
+            # Tables split at row boundaries, repeating the header row
+            parts = self.frame.split(f, self.c)
+            if parts and self.frame.add(parts[0], self.c):
+                self.page_empty = False
+                pending[:0] = parts[1:]
+                continue
+            if self.page_empty:
+                raise LayoutError(f"Flowable {f.__class__.__name__} too large for an empty page")
+            self.new_page()
+            pending.insert(0, f)
+
+    def extend(self, flowables):
+        for f in flowables:
+            self.add(f)
+
+    def new_page(self):
+        self.c.showPage()
+        self.frame = self._new_frame()
+        self.page_empty = True
+
+
+def create_full_history_report(db_session, user, output=None, chunk_size=500,
+                               rows_per_table=FULL_REPORT_ROWS_PER_TABLE):
+    """
+    Audit report with the complete acervo and reload history.
+
+    Firearms and sessions are read from the database in keyset-paginated
+    chunks and laid out page by page, so memory does not grow with the size
+    of the history. Written to `output` (any binary file object) or to a
+    SpooledTemporaryFile that moves to disk past FULL_REPORT_SPOOL_SIZE.
+    Returns the file object, rewound.
+    """
+    if output is None:
+        output = tempfile.SpooledTemporaryFile(max_size=FULL_REPORT_SPOOL_SIZE)
+    styles = _get_styles()
+
+    c = canvas.Canvas(output, pagesize=A4, pageCompression=1)
+    c.setTitle(f"Relatório Completo {user.name}")
+    flow = _PageFlow(c)
+    flow.extend(_report_head(user, styles))
+
+    # 2. Arsenal (Acervo)
+    flow.add(Paragraph("<b>2. ACERVO DE ARMAS CADASTRADO</b>", styles['Heading4']))
+    has_firearms = False
+    for firearms in iter_firearms_keyset(db_session, user.id, chunk_size):
+        has_firearms = True
+        for i in range(0, len(firearms), rows_per_table):
+            flow.add(_firearms_table(firearms[i:i + rows_per_table]))
+    if not has_firearms:
+        flow.add(Paragraph("<i>Nenhuma arma cadastrada neste perfil.</i>", styles['Normal']))
+    flow.add(Spacer(1, 18))
+
+    # 3. Reload Log (Logbook) - complete history, newest first
+    flow.add(Paragraph("<b>3. REGISTRO DE RECARGAS (Histórico Completo)</b>", styles['Heading4']))
+    total_sessions = 0
+    total_rounds = 0
+    for rows in iter_sessions_keyset(db_session, user.id, chunk_size):
+        total_sessions += len(rows)
+        total_rounds += sum(r.quantity or 0 for r in rows)
+        for i in range(0, len(rows), rows_per_table):
+            flow.add(_log_table([_log_row(r) for r in rows[i:i + rows_per_table]]))
+    if total_sessions:
+        flow.add(Spacer(1, 6))
+        flow.add(Paragraph(f"Total: {total_sessions} recargas | {total_rounds} munições", styles['Normal']))
+    else:
+        flow.add(Paragraph("<i>Nenhuma atividade de recarga registrada.</i>", styles['Normal']))
+
+    # Footer
+    flow.extend(_report_footer(user, styles))
+
+    c.save()
+    output.seek(0)
+    return output
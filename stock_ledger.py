@@ -0,0 +1,130 @@
+"""
+Stock ledger: append-only StockMovement rows plus periodic StockSnapshot
+checkpoints.
+
+InventoryItem.quantity / price_unit stay the fast "current" view; every
+change to them is also recorded here as a signed movement (purchase,
+consumption, adjustment) in the same transaction. Point-in-time questions
+("what did I have on date X, and what was it worth") start from each
+item's latest snapshot at or before X and add only the movements after it,
+so their cost is bounded by SNAPSHOT_INTERVAL, not by the ledger length.
+
+Movements are ordered by id, i.e. by when they were recorded.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, insert, select
+
+from models import StockMovement, StockSnapshot
+
+PURCHASE, CONSUMPTION, ADJUSTMENT = "purchase", "consumption", "adjustment"
+
+# Movements per item between snapshots: the most a point-in-time query replays
+SNAPSHOT_INTERVAL = 100
+
+StockPosition = namedtuple("StockPosition", "item_id category name quantity value")
+
+
+def movement(item, kind, quantity, cost, reload_session_id=None, created_at=None):
+    """Row dict for record_movements(); item is the InventoryItem being changed."""
+    return {
+        "user_id": item.user_id,
+        "item_id": item.id,
+        "reload_session_id": reload_session_id,
+        "kind": kind,
+        "quantity": quantity,
+        "cost": cost,
+        "category": item.category,
+        "item_name": item.name,
+        "created_at": created_at or datetime.now(),
+    }
+
+
+def record_movements(db_session, rows):
+    """Appends movements (one multi-row INSERT) and snapshots items that are due."""
+    if not rows:
+        return
+    db_session.execute(insert(StockMovement), rows)
+    user_items = {}
+    for row in rows:
+        user_items.setdefault(row["user_id"], set()).add(row["item_id"])
+    for user_id, item_ids in user_items.items():
+        take_snapshots(db_session, user_id, item_ids, min_movements=SNAPSHOT_INTERVAL)
+
+
+def _latest_snapshots(user_id, at=None, item_ids=None):
+    """Subquery: each item's most recent snapshot (taken at or before `at`)."""
+    S = StockSnapshot
+    rn = func.row_number().over(partition_by=S.item_id, order_by=S.last_movement_id.desc()).label("rn")
+    q = select(S.item_id, S.last_movement_id, S.quantity, S.value, S.category, S.item_name, rn).where(S.user_id == user_id)
+    if at is not None:
+        q = q.where(S.taken_at <= at)
+    if item_ids is not None:
+        q = q.where(S.item_id.in_(item_ids))
+    ranked = q.subquery()
+    return select(ranked).where(ranked.c.rn == 1).subquery()
+
+
+def _positions(db_session, user_id, at=None, item_ids=None):
+    """{item_id: (StockPosition, last_movement_id, movements_since_snapshot, taken_at)}."""
+    snap = _latest_snapshots(user_id, at, item_ids)
+    positions = {}
+    for row in db_session.execute(select(snap)):
+        positions[row.item_id] = [row.quantity, row.value, row.category, row.item_name, row.last_movement_id, 0, None]
+
+    M = StockMovement
+    last_id = func.max(M.id)
+    # SQLite returns bare columns (category, item_name, created_at) from the max(id) row
+    q = (
+        select(M.item_id, func.sum(M.quantity), func.sum(M.cost), last_id, func.count(),
+               M.category, M.item_name, M.created_at)
+        .select_from(M.__table__.outerjoin(snap, snap.c.item_id == M.item_id))
+        .where(M.user_id == user_id, M.id > func.coalesce(snap.c.last_movement_id, 0))
+        .group_by(M.item_id)
+    )
+    if at is not None:
+        q = q.where(M.created_at <= at)
+    if item_ids is not None:
+        q = q.where(M.item_id.in_(item_ids))
+    for item_id, dq, dv, max_id, count, category, name, created_at in db_session.execute(q):
+        p = positions.setdefault(item_id, [0.0, 0.0, category, name, 0, 0, None])
+        p[0] += dq or 0
+        p[1] += dv or 0
+        p[2], p[3], p[4], p[5], p[6] = category, name, max_id, count, created_at
+    return {
+        item_id: (StockPosition(item_id, p[2], p[3], p[0], p[1]), p[4], p[5], p[6])
+        for item_id, p in positions.items()
+    }
+
+
+def stock_at(db_session, user_id, at=None, include_empty=False):
+    """
+    StockPosition per item as of `at` (default: now), ordered by category and
+    name. value is the cost basis in R$ (purchases minus consumption at the
+    average price of the time).
+    """
+    positions = [pos for pos, _, _, _ in _positions(db_session, user_id, at).values()]
+    if not include_empty:
+        positions = [p for p in positions if abs(p.quantity) > 1e-9]
+    return sorted(positions, key=lambda p: (p.category, p.name))
+
+
+def take_snapshots(db_session, user_id, item_ids=None, min_movements=1):
+    """
+    Checkpoints the current totals of the given items (all of the user's by
+    default) that have at least min_movements movements since their last
+    snapshot. Returns the number of snapshots written.
+    """
+    rows = [
+        {
+            "user_id": user_id, "item_id": pos.item_id, "last_movement_id": last_id,
+            "taken_at": taken_at, "quantity": pos.quantity, "value": pos.value,
+            "category": pos.category, "item_name": pos.name,
+        }
+        for pos, last_id, since, taken_at in _positions(db_session, user_id, None, item_ids).values()
+        if since >= min_movements
+    ]
+    if rows:
+        db_session.execute(insert(StockSnapshot), rows)
+    return len(rows)
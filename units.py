@@ -0,0 +1,65 @@
+"""
+Canonical units for stock quantities.
+
+Stock is stored in one base unit per dimension: grains for anything
+weighed (powder), units for anything counted (projectiles, primers,
+cases). InventoryItem.unit holds the base unit and display_unit what the
+user bought it in, so conversions happen only when reading input and
+showing values; every sum and deduction in SQL works on comparable
+numbers, and a session's charge (grains) can be subtracted from powder
+stock directly.
+"""
+GRAIN = "gr"
+UNIT = "un"
+
+# Display unit -> base units per display unit
+_FACTORS = {
+    "gr": (GRAIN, 1.0),
+    "grains": (GRAIN, 1.0),
+    "g": (GRAIN, 15.4324),
+    "kg": (GRAIN, 15432.4),
+    "lb": (GRAIN, 7000.0),
+    "un": (UNIT, 1.0),
+}
+
+DISPLAY_UNITS = ("g", "grains", "un", "kg", "lb")
+
+
+def _factor(unit):
+    return _FACTORS.get((unit or "").strip().lower())
+
+
+def category_unit(category):
+    """Base unit stock of `category` is kept in: grains for powder, units for everything else."""
+    return GRAIN if category == "Pólvora" else UNIT
+
+
+def base_unit(unit):
+    """Base unit for quantities entered in `unit` (GRAIN or UNIT), None if unknown."""
+    known = _factor(unit)
+    return known[0] if known else None
+
+
+def to_base(amount, unit, category):
+    """
+    Quantity of `category` entered in `unit`, in the category's base unit.
+    Raises ValueError for units that do not measure it (grams of primers,
+    units of powder) and for unknown units.
+    """
+    known = _factor(unit)
+    if known is None or known[0] != category_unit(category):
+        raise ValueError(f"{category} é controlado em {category_unit(category)}; "
+                         f"não é possível usar {unit}.")
+    return amount * known[1]
+
+
+def from_base(amount, unit):
+    """Base-unit quantity expressed in display `unit`."""
+    return amount / factor(unit)
+
+
+def factor(unit):
+    """Base units per `unit` (e.g. 7000 grains per lb); 1 for unknown units."""
+    known = _factor(unit)
+    return known[1] if known else 1.0
+